@@ -0,0 +1 @@
+"""Benchmarks for the hot paths. Run them from the top of the repo."""
@@ -0,0 +1,113 @@
+"""\
+Benchmark the single-pass participant scanner against scanning the subject and
+body once for each attendee regex, on bodies from 1 KB to 1 MB.
+
+    python -m benchmarks.attendees [--number N]
+"""
+
+
+import argparse
+import random
+import re
+import string
+import timeit
+
+from frank.calendar.ingest import (
+    merge_patterns, participant_userids, recipient_userids, ATTENDEE_REGEXEN,
+)
+
+
+# The attendee regex as it was, before it only started at the start of words.
+LEGACY_REGEXEN = [
+    re.compile(r'(?P<userid> [a-z]+ (?: \d [a-z]+ )? ) @', re.VERBOSE),
+]
+
+# Patterns to see how both approaches do as the list grows.
+EXTRA_REGEXEN = [
+    re.compile(r'\b mailto: (?P<userid> [a-z]+ \d [a-z]+ ) \b', re.VERBOSE),
+    re.compile(r'\( (?P<userid> [a-z]{2,3} \d [a-z] ) \)', re.VERBOSE),
+    re.compile(r'\b computing \s id: \s (?P<userid> \w+ )', re.VERBOSE),
+]
+
+SIZES = [1 << 10, 1 << 14, 1 << 17, 1 << 20]
+
+
+def legacy_userids(form, regexen):
+    """What ingest did before: one pass over each text for each regex."""
+    attendees = recipient_userids(form)
+    attendee_set = set(attendees)
+    for text in (form['headers[Subject]'], form['plain']):
+        for regex in regexen:
+            for match in regex.finditer(text):
+                userid = match.group('userid')
+                if userid not in attendee_set:
+                    attendee_set.add(userid)
+                    attendees.append(userid)
+    return attendees
+
+
+def make_form(size, seed=0):
+    """Make a message with a body of about `size` characters."""
+    rng = random.Random(seed)
+    userids = [
+        ''.join(rng.choice(string.ascii_lowercase) for _ in range(3)) +
+        str(rng.randint(0, 9)) + rng.choice(string.ascii_lowercase)
+        for _ in range(200)
+    ]
+    words = []
+    length = 0
+    while length < size:
+        if rng.random() < 0.02:
+            word = rng.choice(userids) + '@virginia.edu'
+        else:
+            word = ''.join(
+                rng.choice(string.ascii_lowercase)
+                for _ in range(rng.randint(2, 10))
+            )
+        words.append(word)
+        length += len(word) + 1
+    return {
+        'envelope[from]': 'err8n@virginia.edu',
+        'headers[To]': ', '.join(u + '@virginia.edu' for u in userids[:5]),
+        'headers[Subject]': 'Meeting with {}@'.format(userids[5]),
+        'plain': ' '.join(words),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=3,
+                        help='How many times to scan each body.')
+    args = parser.parse_args()
+
+    legacy_regexen = LEGACY_REGEXEN + EXTRA_REGEXEN
+    (scanner, groups) = merge_patterns(ATTENDEE_REGEXEN + EXTRA_REGEXEN)
+
+    def run(fn, form):
+        return min(timeit.repeat(
+            lambda: fn(form), number=args.number, repeat=3,
+        )) / args.number
+
+    print('{:>8} {:>9} {:>9} {:>7} {:>9} {:>9} {:>7}'.format(
+        'size', 'legacy/1', 'single/1', 'x', 'legacy/4', 'single/4', 'x',
+    ))
+    for size in SIZES:
+        form = make_form(size)
+        assert legacy_userids(form, LEGACY_REGEXEN) \
+            == participant_userids(form)
+
+        legacy = run(lambda f: legacy_userids(f, LEGACY_REGEXEN), form)
+        single = run(participant_userids, form)
+        legacy_n = run(lambda f: legacy_userids(f, legacy_regexen), form)
+        single_n = run(
+            lambda f: participant_userids(f, scanner, groups), form,
+        )
+        print('{:>8} {:>8.2f}ms {:>8.2f}ms {:>6.2f}x '
+              '{:>8.2f}ms {:>8.2f}ms {:>6.2f}x'.format(
+                  size, legacy * 1e3, single * 1e3, legacy / single,
+                  legacy_n * 1e3, single_n * 1e3, legacy_n / single_n,
+              ))
+
+
+if __name__ == '__main__':
+    main()
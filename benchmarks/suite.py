@@ -0,0 +1,228 @@
+"""\
+Benchmark the parsing and extraction hot paths, and compare them against the
+baseline committed in benchmarks/baseline.json.
+
+    python -m benchmarks.suite [--compare] [--save] [--threshold T] [NAME...]
+
+Without `--compare`, this just prints the time each case takes. With it, each
+case is compared against the baseline, and it exits with 1 if any is slower
+by more than the threshold (0.25, or 25%, by default). `--save` replaces the
+baseline with this run. Timings depend on the interpreter and the machine,
+so the comparison refuses to run on a different Python version or machine
+from the one that recorded the baseline, unless it's given `--force`. Save a
+baseline and compare against it on the same one, before and after a change.
+
+The attendee cases fill the profile index beforehand, so they time the
+scanning, and not creating profiles in the session.
+"""
+
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+import timeit
+
+from benchmarks.attendees import make_form
+from frank.calendar.ingest import (
+    read_attendee, read_recipients, scan_userids,
+)
+from frank.loadtest import when_line
+from frank.model import MeetingTime
+from frank.utils import date_parses
+
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+START = datetime.datetime(2016, 3, 7, 10, 30)
+
+BODY_SIZES = [1 << 10, 1 << 14, 1 << 17, 1 << 20]
+RECIPIENT_COUNTS = [10, 100, 1000]
+
+
+def parse_case(shape):
+    """Parse a When line of `shape` the way it's parsed without the cache."""
+    line = when_line(shape, START, 45)
+    if shape == 'once':
+        return lambda: MeetingTime.parse_once(line)
+    return lambda: MeetingTime.parse_recurring(line)
+
+
+def date_parses_case(date_str):
+    return lambda: date_parses(date_str, '%A, %B %d, %Y')
+
+
+def attendee_case(size):
+    """Scan the body of a message of about `size` characters."""
+    text = make_form(size)['plain']
+    index = {userid: userid for userid in scan_userids(text)}
+    return lambda: read_attendee(set(), index, text)
+
+
+def recipient_case(count):
+    """Read the recipients of a message sent to `count` people."""
+    form = {'headers[To]': ', '.join(
+        '"User {0}" <u{0:04d}x@virginia.edu>'.format(i) for i in range(count)
+    )}
+    index = {'u{:04d}x'.format(i): i for i in range(count)}
+    return lambda: read_recipients(form, index)
+
+
+# Each case is (name, a function that sets it up and returns what to time,
+# how many times to call that in each repeat).
+CASES = (
+    [('parse_once', lambda: parse_case('once'), 2000)] +
+    [('parse_recurring/' + shape, lambda shape=shape: parse_case(shape),
+      2000)
+     for shape in ('daily', 'weekly', 'monthly', 'annually')] +
+    [('date_parses/match',
+      lambda: date_parses_case('Monday, March 07, 2016'), 5000),
+     ('date_parses/miss',
+      lambda: date_parses_case('Occurs every Monday'), 5000)] +
+    [('read_attendee/{}'.format(size),
+      lambda size=size: attendee_case(size), max((1 << 20) // size, 3))
+     for size in BODY_SIZES] +
+    [('read_recipients/{}'.format(count),
+      lambda count=count: recipient_case(count), 10000 // count)
+     for count in RECIPIENT_COUNTS]
+)
+
+
+def measure(fn, number, repeat=5):
+    """Return the best seconds a call to `fn` takes over `repeat` runs."""
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) / number
+
+
+def run(names=None, scale=1.0):
+    """\
+    This times the cases named in `names`, or all of them, and returns a dict
+    of the seconds a call takes for each. `scale` multiplies how many calls
+    each run makes.
+    """
+    results = {}
+    for (name, setup, number) in CASES:
+        if names and not any(name.startswith(n) for n in names):
+            continue
+        results[name] = measure(setup(), max(int(number * scale), 1))
+    return results
+
+
+def environment():
+    """Return what the timings depend on, besides the code."""
+    return {
+        'implementation': platform.python_implementation(),
+        'python': '.'.join(platform.python_version_tuple()[:2]),
+        'machine': platform.machine(),
+    }
+
+
+def read_baseline(path):
+    """Return the environment and the results of the baseline at `path`."""
+    with open(path) as fin:
+        baseline = json.load(fin)
+    results = baseline.pop('results')
+    return (baseline, results)
+
+
+def write_baseline(path, results):
+    with open(path, 'w') as fout:
+        json.dump(dict(environment(), results=results),
+                  fout, indent=2, sort_keys=True)
+        fout.write('\n')
+
+
+def differences(recorded):
+    """\
+    This returns a description of each way this environment is different
+    from the one `recorded` with a baseline.
+    """
+    current = environment()
+    return [
+        '{} {} instead of {}'.format(key, current[key], recorded.get(key))
+        for key in sorted(current) if current[key] != recorded.get(key)
+    ]
+
+
+def compare(results, baseline, threshold):
+    """\
+    This returns the lines of a report comparing `results` to `baseline`, and
+    the names of the cases that are slower by more than `threshold`.
+    """
+    lines = ['{:<28} {:>11} {:>11} {:>7}'.format(
+        'case', 'baseline', 'now', 'ratio',
+    )]
+    regressions = []
+    for (name, seconds) in sorted(results.items()):
+        before = baseline.get(name)
+        if before is None:
+            lines.append('{:<28} {:>11} {:>9.2f}us {:>7}'.format(
+                name, '-', seconds * 1e6, 'new',
+            ))
+            continue
+        ratio = seconds / before
+        flag = ''
+        if ratio > 1 + threshold:
+            regressions.append(name)
+            flag = '  SLOWER'
+        lines.append('{:<28} {:>9.2f}us {:>9.2f}us {:>6.2f}x{}'.format(
+            name, before * 1e6, seconds * 1e6, ratio, flag,
+        ))
+    return (lines, regressions)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('names', nargs='*',
+                        help='Only run the cases starting with these.')
+    parser.add_argument('--compare', action='store_true',
+                        help='Compare against the baseline.')
+    parser.add_argument('--save', action='store_true',
+                        help='Save this run as the baseline.')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='How much slower a case can get, as a fraction.')
+    parser.add_argument('--baseline', default=BASELINE,
+                        help='The baseline file.')
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='Multiply the number of calls in each run.')
+    parser.add_argument('--force', action='store_true',
+                        help='Use a baseline from another Python or machine.')
+    args = parser.parse_args()
+
+    # Only some of the cases are merged into the baseline when they're
+    # saved, so that has to be from the same environment too.
+    if args.compare or (args.save and args.names):
+        (recorded, baseline) = read_baseline(args.baseline)
+        different = differences(recorded)
+        if different and not args.force:
+            sys.exit('The baseline is from another environment ({}). Save '
+                     'one here first, or use --force.'.format(
+                         '; '.join(different),
+                     ))
+
+    results = run(args.names, args.scale)
+
+    if args.compare:
+        (lines, regressions) = compare(results, baseline, args.threshold)
+        print('\n'.join(lines))
+    else:
+        regressions = []
+        for (name, seconds) in sorted(results.items()):
+            print('{:<28} {:>9.2f}us'.format(name, seconds * 1e6))
+
+    if args.save:
+        if args.names:
+            baseline.update(results)
+            results = baseline
+        write_baseline(args.baseline, results)
+
+    if regressions:
+        print('{} case(s) slower than the baseline by more than {:.0%}'.format(
+            len(regressions), args.threshold,
+        ))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
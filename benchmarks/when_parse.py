@@ -0,0 +1,190 @@
+"""\
+Benchmark `MeetingTime.parse` against the `strptime`-based parser it
+replaced, and check that they agree.
+
+    python -m benchmarks.when_parse [--number N]
+"""
+
+
+import argparse
+import datetime
+import random
+import timeit
+
+from frank import when
+from frank.model import MeetingTime, RecurPeriod
+from frank.utils import date_parses
+
+
+def legacy_parse_once(line):
+    """The `strptime` version of `MeetingTime.parse_once`."""
+    parts = line.split()
+    parts[6] = parts[6].replace('.', '')
+    parts[7] = parts[7].replace(':', '')
+    parts2 = parts[5].split('-')
+
+    d_str = ' '.join(parts[:5] + [parts2[0], parts[7]])
+    start = datetime.datetime.strptime(
+        d_str, '%A, %B %d, %Y %I:%M %p (%Z%z)',
+        )
+    dend = datetime.datetime.strptime(
+        ' '.join(parts[:4] + [parts2[1]] + parts[6:8]),
+        '%A, %B %d, %Y %I:%M %p (%Z%z)',
+    )
+    return (start, dend, RecurPeriod.none, None)
+
+
+def legacy_parse_recurring(line):
+    """The `strptime` version of `MeetingTime.parse_recurring`."""
+    now = datetime.datetime.now()
+    words = line.split()
+    prefix = ' '.join(words[:3])
+
+    if line.startswith('Occurs every day from '):
+        start = datetime.datetime.strptime(
+            '%s %s %s' % (words[10], words[4], words[5]), '%m/%d/%Y. %I:%M %p',
+            )
+        end = datetime.datetime.strptime(
+            '%s %s %s' % (words[10], words[7], words[8]), '%m/%d/%Y. %I:%M %p',
+            )
+        return (start, end, RecurPeriod.daily, None)
+
+    elif date_parses(prefix, 'Occurs every %A'):
+        start = datetime.datetime.strptime(
+            '%s %s %s' % (words[10], words[4], words[5]), '%m/%d/%Y. %I:%M %p',
+            )
+        end = datetime.datetime.strptime(
+            '%s %s %s' % (words[10], words[7], words[8]), '%m/%d/%Y. %I:%M %p',
+            )
+        step = start
+        while step.strftime('%A') != words[2]:
+            step = step + datetime.timedelta(days=1)
+        return (start, end, RecurPeriod.weekly, step.weekday())
+
+    elif line.startswith('Occurs every month on day '):
+        start = datetime.datetime.strptime(
+            '%s %s %s' % (words[16], words[10], words[11]),
+            '%m/%d/%Y. %I:%M %p',
+            )
+        end = datetime.datetime.strptime(
+            '%s %s %s' % (words[16], words[13], words[14]),
+            '%m/%d/%Y. %I:%M %p',
+            )
+        return (start, end, RecurPeriod.monthly, int(words[5]))
+
+    elif date_parses(prefix, 'Occurs every %B'):
+        start = datetime.datetime.strptime(
+            '%s %s, %s, %s %s' % (
+                words[2], words[3], now.year, words[5], words[6],
+            ),
+            '%B %d, %Y, %I:%M %p',
+            )
+        start_date = datetime.datetime.strptime(words[11], '%m/%d/%Y.')
+        start = datetime.datetime.combine(start_date.date(), start.time())
+        end = datetime.datetime.strptime(
+            '%s %s, %s, %s %s' % (
+                words[2], words[3], start.year, words[8], words[9],
+            ),
+            '%B %d, %Y, %I:%M %p',
+            )
+        return (start, end, RecurPeriod.annually, (start.month, start.day))
+
+    raise Exception('Invalid "when" line: "{}"'.format(line))
+
+
+def legacy_parse(line):
+    """The `strptime` version of `MeetingTime.parse`."""
+    if line.startswith('Occurs '):
+        return legacy_parse_recurring(line)
+    else:
+        return legacy_parse_once(line)
+
+
+def clock(dt):
+    """Format the time the way Outlook does."""
+    return dt.strftime('%I:%M %p').lstrip('0')
+
+
+def make_lines(count, seed=0):
+    """Generate `count` When lines of every form."""
+    rng = random.Random(seed)
+    lines = []
+    for i in range(count):
+        start = datetime.datetime(
+            rng.randint(2010, 2030), rng.randint(1, 12), rng.randint(1, 28),
+            rng.randint(0, 23), rng.choice([0, 15, 30, 45]),
+        )
+        end = start + datetime.timedelta(minutes=rng.choice([15, 30, 60]))
+        effective = '{}/{}/{}.'.format(start.month, start.day, start.year)
+        times = 'from {} to {} effective {}'.format(
+            clock(start), clock(end), effective,
+        )
+        tail = ' (UTC-05:00) Eastern Time (US & Canada)'
+        form = i % 5
+        if form == 0:
+            line = '{} {}-{}{} (UTC-05:00) Eastern Time (US & Canada)'.format(
+                start.strftime('%A, %B %d, %Y'),
+                start.strftime('%I:%M %p'), clock(end), rng.choice(['', '.']),
+            )
+        elif form == 1:
+            line = 'Occurs every day ' + times + tail
+        elif form == 2:
+            line = 'Occurs every {} {}{}'.format(
+                start.strftime('%A'), times, tail,
+            )
+        elif form == 3:
+            line = 'Occurs every month on day {} of the month {}{}'.format(
+                start.day, times, tail,
+            )
+        else:
+            line = 'Occurs every {} {} {}{}'.format(
+                rng.choice(['January', 'February', 'May', 'December']),
+                rng.randint(1, 28), times, tail,
+            )
+        lines.append(line)
+    return lines
+
+
+def check(lines):
+    """Make sure both parsers agree on every line."""
+    for line in lines:
+        parsed = MeetingTime.parse(line)
+        (start, end, recur, recur_param) = legacy_parse(line)
+        assert parsed.start_time == start, line
+        assert parsed.start_time.tzinfo == start.tzinfo, line
+        assert parsed.duration == end - start, line
+        assert parsed.recur == recur, line
+        assert parsed.recur_param == recur_param, line
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=5,
+                        help='How many times to parse each line.')
+    parser.add_argument('--lines', type=int, default=2000,
+                        help='How many lines to generate.')
+    args = parser.parse_args()
+
+    lines = make_lines(args.lines)
+    check(lines)
+
+    def run(fn):
+        return min(timeit.repeat(
+            lambda: [fn(line) for line in lines], number=args.number, repeat=3,
+        )) / (args.number * len(lines))
+
+    legacy = run(legacy_parse)
+    compiled = run(lambda line: MeetingTime.from_parsed(when.parse(line)))
+    cached = run(MeetingTime.parse)
+    print('{} lines agree'.format(len(lines)))
+    print('strptime: {:8.2f} us/line'.format(legacy * 1e6))
+    print('compiled: {:8.2f} us/line ({:.2f}x)'.format(
+        compiled * 1e6, legacy / compiled,
+    ))
+    print('cached:   {:8.2f} us/line ({:.2f}x)'.format(
+        cached * 1e6, legacy / cached,
+    ))
+
+
+if __name__ == '__main__':
+    main()
@@ -2,10 +2,12 @@
 
 
 import os
+import shutil
 
 from flask import current_app
 
 from frank import app as wsgi
+from frank.errors import ERRORS
 
 
 def before_all(context):
@@ -19,6 +21,12 @@ def before_all(context):
 
     context.app = context.app_info['app']
     context.db = context.app_info['db']
+    context.settings = {
+        key: app.config[key] for key in (
+            'SQLALCHEMY_DATABASE_URI', 'FRANK_SPOOL', 'FRANK_ATTACHMENTS',
+            'FRANK_ATTACHMENT_MAX_BYTES',
+        )
+    }
 
 
 def after_all(context):
@@ -27,6 +35,13 @@ def after_all(context):
     del context.app.config['SQLALCHEMY_DATABASE_URI']
 
 
+def after_scenario(context, scenario):
+    """Put back the settings a scenario changed, and clean up after it."""
+    context.app.config.update(context.settings)
+    if 'scratch_dir' in context:
+        shutil.rmtree(context.scratch_dir)
+
+
 def before_feature(context, feature):
     with context.app.app_context():
         context.db.create_all()
@@ -35,4 +50,5 @@ def before_feature(context, feature):
 
 def after_feature(context, feature):
     with context.app.app_context():
+        ERRORS.flush()
         context.app_info['db'].drop_all()
@@ -67,6 +67,33 @@ Feature: As a SLab staff-person
     Then I should see that the invitation is pending
     And I should not see a link to a consultation
 
+  Scenario: Marks pending meetings complete once they start
+    Given Frank is alive
+    When I send him a meeting invitation for tomorrow
+    And its meeting starts
+    And the status scheduler runs
+    And I visit the invitation's page
+    Then I should see that the invitation is complete
+
+  Scenario: Makes consults for a recurring meeting as it meets
+    Given Frank is alive
+    When I send him an invitation for a meeting every day since yesterday
+    And a day goes by
+    And the status scheduler runs
+    Then I should see 3 consults for it
+
+  Scenario: Totals up consultations for each person
+    Given Frank is alive
+    When I send him an invitation to a meeting with nw4jd yesterday
+    And I ask for nw4jd's consults by month
+    Then I should see 1 consult of 30 minutes
+
+  Scenario: Exports the invitations
+    Given Frank is alive
+    When I send him a meeting invitation
+    And I export the invitations
+    Then I should see it in the export
+
   Scenario Outline: Identifies recurring meetings
     Given Frank is alive
     When I send him an invitation for a meeting that meets <recurring> at <start_time> for <duration>, starting <start_date>
@@ -80,6 +107,121 @@ Feature: As a SLab staff-person
       | every month on day 10 of the month | 2:30 PM    | 30 minutes | 5/10/2016  |
       | every May 10                       | 3:00 PM    | 60 minutes | 5/10/2016  |
 
+  Scenario Outline: Lists the occurrences of recurring meetings
+    Given Frank is alive
+    When I send him an invitation for a meeting that meets <recurring> at <start_time> for <duration>, starting <start_date>
+    And I ask for the occurrences from <start> to <end>
+    Then I should see <count> occurrences of it
+
+  Examples: Occurrences
+      | recurring                          | start_time | duration   | start_date | start      | end        | count |
+      | every Friday                       | 4:00 PM    | 30 minutes | 4/29/2016  | 2016-05-01 | 2016-06-01 | 4     |
+      | every day                          | 2:00 PM    | 30 minutes | 5/10/2016  | 2016-05-01 | 2016-06-01 | 22    |
+      | every month on day 10 of the month | 2:30 PM    | 30 minutes | 5/10/2016  | 2016-05-01 | 2016-09-01 | 4     |
+      | every May 10                       | 3:00 PM    | 60 minutes | 5/10/2016  | 2016-01-01 | 2017-01-01 | 1     |
+
+  Scenario: Reads recurring meetings in UTC from a calendar part
+    Given Frank is alive
+    When I send him a calendar part for a meeting every TH from 20160121T020000Z, in America/New_York
+    Then I should see it stored as meeting every Wednesday at 09:00 PM
+
+  Scenario: Reads one-off meetings in UTC from a calendar part
+    Given Frank is alive
+    When I send him a calendar part for a meeting once at 20160420T140000Z, in America/New_York
+    Then I should see it stored as meeting once on Wednesday, April 20 at 10:00 AM
+
+  Scenario: Accepts a batch of invitations
+    Given Frank is alive
+    When I send him a batch of 3 meeting invitations and one bad one
+    Then I should get back an invitation for each good one
+    And I should get back an error for the bad one
+
+  Scenario: Saves the rest of a batch when one invitation can't be saved
+    Given Frank is alive
+    When I send him a batch of 3 meeting invitations and one that can't be saved
+    Then I should get back an invitation for each good one
+    And I should get back an error for the bad one
+
+  Scenario: Spools messages while the database is down
+    Given Frank is alive
+    And he is spooling incoming messages
+    When the database goes down
+    And I send him a meeting invitation called "Spooled meeting"
+    And I send him a meeting invitation called "Spooled meeting that fails"
+    Then he should have spooled them
+    When the database comes back
+    And the spool is drained, refusing "Spooled meeting that fails"
+    Then I should see an invitation called "Spooled meeting"
+    And I should see 1 message left in the spool
+
+  Scenario: Keeps the metadata of an attachment
+    Given Frank is alive
+    And he keeps attachments of up to 1000 bytes in a new store
+    When I send him an invitation called "Agenda" with a 100-byte attachment called "agenda.txt"
+    Then I should see a 100-byte attachment called "agenda.txt" on it, stored under its hash
+
+  Scenario: Stores an attachment sent twice once
+    Given Frank is alive
+    And he keeps attachments of up to 1000 bytes in a new store
+    When I send him an invitation called "First agenda" with a 200-byte attachment called "agenda.txt"
+    And I send him an invitation called "Second agenda" with a 200-byte attachment called "agenda.txt"
+    Then I should see the same attachment on both
+    And I should see 1 file(s) in the store
+
+  Scenario: Drops attachments that are too big
+    Given Frank is alive
+    And he keeps attachments of up to 1000 bytes in a new store
+    When I send him an invitation called "Big agenda" with a 2000-byte attachment called "agenda.txt"
+    Then I should see no attachments on it
+    And I should see 0 file(s) in the store
+
+  Scenario: Imports invitations from an archive once
+    Given Frank is alive
+    When I import the invitations in the mbox archive
+    Then I should see 2 created, 1 duplicate(s), and 1 error(s)
+    And I should see 2 invitations from the archive, with 4 attendees
+    When I import them again from a Maildir
+    Then I should see 0 created, 3 duplicate(s), and 1 error(s)
+    And I should see 2 invitations from the archive, with 4 attendees
+
+  Scenario: Lists invitations a page at a time
+    Given Frank is alive
+    When I send him a batch of 3 meeting invitations and one bad one
+    And I list daf2c's invitations 2 at a time
+    Then I should see each invitation in the batch once
+
+  Scenario: Counts an error that keeps happening once
+    Given Frank is alive
+    When I send him 3 invitations with different bad times
+    Then I should see one error report for them, counted 3 times
+
+  Scenario: Reports how long ingesting takes
+    Given Frank is alive
+    When I send him a meeting invitation
+    And I visit the metrics page
+    Then I should see timings for the parse stage
+    And I should see a count of created invitations
+
+  Scenario: Notices meetings that conflict
+    Given Frank is alive
+    When I send him a meeting invitation for tomorrow
+    And I send him another meeting invitation at the same time
+    And I visit the invitation's page
+    Then I should see that it conflicts with the first
+
+  Scenario: Doesn't send an invitation's page again when it hasn't changed
+    Given Frank is alive
+    When I send him a meeting invitation
+    And I visit the invitation's page
+    And I visit the invitation's page again with its ETag
+    Then I should be told it hasn't changed
+
+  Scenario: Doesn't duplicate a resent invitation
+    Given Frank is alive
+    When I send him a meeting invitation
+    And I send him the same invitation again
+    Then I should get back the first invitation
+
 # TODO: recurring appointments
 # TODO: a job that creates meetings for the previous day
 # TODO: a button that creates meetings on demand
@@ -0,0 +1,26 @@
+Feature: As a SLab staff-person
+  I want to be able to see the meetings on everyone's calendars quickly
+  So that I don't have to wait for recurring meetings to be worked out
+
+  Scenario: Updates the occurrences when an invitation's attendees change
+    Given Frank is alive
+    And the occurrence table is built
+    When I send him an invitation for a meeting every day since yesterday
+    And I add gva9b to its attendees
+    Then gva9b should have occurrences of it in the table
+    When I remove gva9b from its attendees
+    Then gva9b should not have any occurrences of it in the table
+    And gva9b's schedule should have changed
+
+  Scenario: Fills the occurrence table for the horizon
+    Given Frank is alive
+    When I send him an invitation for a meeting every day since 60 days ago
+    And the occurrence table is built for the last 10 days and the next 20
+    Then I should see 30 of its occurrences in the table, from 10 days ago
+
+  Scenario: Moves the horizon along
+    Given Frank is alive
+    When I send him an invitation for a meeting every day since 90 days ago
+    And the occurrence table is built for the last 10 days and the next 20
+    And the horizon is moved to the last 5 days and the next 25
+    Then I should see 30 of its occurrences in the table, from 5 days ago
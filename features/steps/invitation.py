@@ -1,4 +1,11 @@
+import calendar
 import datetime
+import hashlib
+import io
+import mailbox
+import os
+import tempfile
+import time
 
 from bs4 import BeautifulSoup
 from flask import json
@@ -21,11 +28,9 @@ def format_when(datetime, duration):
     return (formatted, datetime, duration)
 
 
-def post_email(
-    context, from_email, to_emails, userids, subject, body, when_phrase
-):
-    (when_formatted, datetime, duration) = when_phrase
-    data = {
+def email_data(from_email, to_emails, subject, body, when_formatted):
+    """This returns the form fields for an incoming email."""
+    return {
         'envelope[from]': from_email,
         'headers[Subject]': subject,
         'headers[To]': ', '.join(to_emails),
@@ -39,6 +44,13 @@ def post_email(
                  '\n'.format(when_formatted, body),
         'reply_plain': '',
     }
+
+
+def post_email(
+    context, from_email, to_emails, userids, subject, body, when_phrase
+):
+    (when_formatted, datetime, duration) = when_phrase
+    data = email_data(from_email, to_emails, subject, body, when_formatted)
     context.post_email = {
         'from': from_email,
         'to': userids,
@@ -48,6 +60,8 @@ def post_email(
         'duration': duration,
     }
 
+    context.post_email['data'] = data
+
     with context.app.app_context():
         response = context.client.post('/calendar/invites/incoming', data=data)
         context.post_email['response'] = response
@@ -56,9 +70,17 @@ def post_email(
         )
 
 
+def scratch_dir(context):
+    """This returns a directory for the scenario, removed after it."""
+    if 'scratch_dir' not in context:
+        context.scratch_dir = tempfile.mkdtemp()
+    return context.scratch_dir
+
+
 @given('Frank is alive')
 def step_impl(context):
     assert context.client
+    context.responses = []
 
 
 @when('I send him a meeting invitation')
@@ -143,11 +165,372 @@ def step_impl(context, userid):
     )
 
 
+@when('I send him a batch of {count:d} meeting invitations and one bad one')
+def step_impl(context, count):
+    (when_formatted, _, _) = format_when(
+        datetime.datetime.now(), datetime.timedelta(minutes=30),
+    )
+    messages = [
+        email_data(
+            'err8n@eservices.virginia.edu',
+            ['frankbot@cloudmailin.com',
+             '"Davis Ferrell" <daf2c@virginia.edu>'],
+            'Batch meeting {}'.format(n),
+            '',
+            when_formatted,
+        )
+        for n in range(count)
+    ]
+    messages.insert(1, email_data(
+        'err8n@eservices.virginia.edu', ['frankbot@cloudmailin.com'],
+        'Batch meeting without a time', '', 'whenever',
+    ))
+    context.batch = {'count': count, 'bad': 1}
+
+    with context.app.app_context():
+        response = context.client.post(
+            '/calendar/invites/incoming/batch',
+            data=json.dumps(messages),
+            content_type='application/json',
+        )
+    assert response.status_code == 200, 'status = [{}] {}'.format(
+        response.status_code, response.status,
+    )
+    context.batch['results'] = json.loads(response.data)['results']
+
+
+# The database refuses invitations with the subject, the way Postgres would
+# one that's too long for its column.
+REFUSE_INVITATION = (
+    "CREATE TRIGGER refuse_invitation BEFORE INSERT ON invitation "
+    "WHEN NEW.subject = '{}' "
+    "BEGIN SELECT RAISE(ABORT, 'refused'); END"
+)
+
+
+def refuse_invitation(context, subject):
+    context.db.engine.execute(
+        REFUSE_INVITATION.format(subject.replace("'", "''")),
+    )
+
+
+@when('I send him a batch of {count:d} meeting invitations and one that '
+      'can\'t be saved')
+def step_impl(context, count):
+    (when_formatted, _, _) = format_when(
+        datetime.datetime.now(), datetime.timedelta(minutes=30),
+    )
+    messages = [
+        email_data(
+            'err8n@eservices.virginia.edu',
+            ['frankbot@cloudmailin.com',
+             '"Davis Ferrell" <daf2c@virginia.edu>'],
+            'Batch meeting {} that can be saved'.format(n),
+            '',
+            when_formatted,
+        )
+        for n in range(count)
+    ]
+    messages.insert(2, email_data(
+        'err8n@eservices.virginia.edu', ['frankbot@cloudmailin.com'],
+        'Batch meeting that can\'t be saved', '', when_formatted,
+    ))
+    context.batch = {'count': count, 'bad': 2}
+
+    with context.app.app_context():
+        refuse_invitation(context, 'Batch meeting that can\'t be saved')
+        try:
+            response = context.client.post(
+                '/calendar/invites/incoming/batch',
+                data=json.dumps(messages),
+                content_type='application/json',
+            )
+        finally:
+            context.db.engine.execute('DROP TRIGGER refuse_invitation')
+    assert response.status_code == 200, 'status = [{}] {}'.format(
+        response.status_code, response.status,
+    )
+    context.batch['results'] = json.loads(response.data)['results']
+
+
+@given('he is spooling incoming messages')
+def step_impl(context):
+    context.app.config['FRANK_SPOOL'] = os.path.join(
+        scratch_dir(context), 'spool.db',
+    )
+
+
+@when('the database goes down')
+def step_impl(context):
+    context.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + \
+        os.path.join(scratch_dir(context), 'missing', 'frank.db')
+
+
+@when('the database comes back')
+def step_impl(context):
+    context.app.config['SQLALCHEMY_DATABASE_URI'] = \
+        'sqlite:///' + context.db_file
+
+
+def post_called(context, subject, files=()):
+    """\
+    This posts an invitation with `subject`, and the (name, content type,
+    contents) of each of `files` attached, and keeps the response.
+    """
+    (when_formatted, _, _) = format_when(
+        datetime.datetime.now(), datetime.timedelta(minutes=30),
+    )
+    data = email_data(
+        'err8n@eservices.virginia.edu', ['frankbot@cloudmailin.com'],
+        subject, '', when_formatted,
+    )
+    for (n, (name, content_type, contents)) in enumerate(files, 1):
+        data['attachment{}'.format(n)] = (
+            io.BytesIO(contents), name, content_type,
+        )
+    context.responses.append(
+        context.client.post('/calendar/invites/incoming', data=data),
+    )
+
+
+@when('I send him a meeting invitation called "{subject}"')
+def step_impl(context, subject):
+    post_called(context, subject)
+
+
+@given('he keeps attachments of up to {max_bytes:d} bytes in a new store')
+def step_impl(context, max_bytes):
+    context.app.config['FRANK_ATTACHMENTS'] = os.path.join(
+        scratch_dir(context), 'attachments',
+    )
+    context.app.config['FRANK_ATTACHMENT_MAX_BYTES'] = max_bytes
+
+
+@when('I send him an invitation called "{subject}" with a '
+      '{size:d}-byte attachment called "{name}"')
+def step_impl(context, subject, size, name):
+    post_called(context, subject, [(name, 'text/plain', b'x' * size)])
+    assert context.responses[-1].status_code == 200
+
+
+def stored_attachments(context):
+    """This returns the attachments of the invitations that were sent."""
+    from frank.model import Attachment
+    ids = [json.loads(response.data)['id'] for response in context.responses]
+    with context.app.app_context():
+        return Attachment.query.filter(Attachment.invitation_id.in_(ids)) \
+            .order_by(Attachment.invitation_id).all()
+
+
+@then('I should see a {size:d}-byte attachment called "{name}" on it, '
+      'stored under its hash')
+def step_impl(context, size, name):
+    from frank.attachments import path_for
+    (attachment,) = stored_attachments(context)
+    sha256 = hashlib.sha256(b'x' * size).hexdigest()
+    assert (attachment.filename, attachment.content_type, attachment.size,
+            attachment.sha256) == (name, 'text/plain', size, sha256)
+    path = path_for(context.app.config['FRANK_ATTACHMENTS'], sha256)
+    with open(path, 'rb') as fin:
+        assert fin.read() == b'x' * size
+
+
+@then('I should see the same attachment on both')
+def step_impl(context):
+    attachments = stored_attachments(context)
+    assert len(attachments) == 2
+    assert attachments[0].sha256 == attachments[1].sha256
+
+
+@then('I should see no attachments on it')
+def step_impl(context):
+    assert stored_attachments(context) == []
+
+
+@then('I should see {count:d} file(s) in the store')
+def step_impl(context, count):
+    files = []
+    for (_, _, names) in os.walk(context.app.config['FRANK_ATTACHMENTS']):
+        files += names
+    assert len(files) == count, files
+
+
+ARCHIVE = os.path.join(os.path.dirname(__file__), os.pardir, 'fixtures',
+                       'invitations.mbox')
+ARCHIVE_SUBJECTS = ['Archived meeting', 'Another archived meeting']
+
+
+def import_fixture(context, path):
+    from frank.archive import import_archive
+    with context.app.app_context():
+        context.imported = import_archive(
+            path, os.path.join(scratch_dir(context), 'attachments'),
+            context.app.config['FRANK_ATTACHMENT_MAX_BYTES'], processes=1,
+            checkpoint=os.path.join(scratch_dir(context), 'imported'),
+        )
+
+
+@when('I import the invitations in the mbox archive')
+def step_impl(context):
+    import_fixture(context, ARCHIVE)
+
+
+@when('I import them again from a Maildir')
+def step_impl(context):
+    path = os.path.join(scratch_dir(context), 'Maildir')
+    maildir = mailbox.Maildir(path)
+    for message in mailbox.mbox(ARCHIVE, create=False):
+        maildir.add(message)
+    os.remove(os.path.join(scratch_dir(context), 'imported'))
+    import_fixture(context, path)
+
+
+@then('I should see {created:d} created, {duplicates:d} duplicate(s), and '
+      '{errors:d} error(s)')
+def step_impl(context, created, duplicates, errors):
+    stats = context.imported
+    assert (stats.created, stats.duplicates, stats.errors) \
+        == (created, duplicates, errors), str(stats)
+
+
+@then('I should see {count:d} invitations from the archive, with '
+      '{attendees:d} attendees')
+def step_impl(context, count, attendees):
+    from frank.model import invitation_attendees, Invitation
+    with context.app.app_context():
+        ids = [
+            invite_id for (invite_id,) in context.db.session
+            .query(Invitation.id)
+            .filter(Invitation.subject.in_(ARCHIVE_SUBJECTS))
+        ]
+        assert len(ids) == count, ids
+        found = context.db.session.query(invitation_attendees) \
+            .filter(invitation_attendees.c.invitation_id.in_(ids)).count()
+        assert found == attendees, found
+
+
+@then('he should have spooled them')
+def step_impl(context):
+    assert [response.status_code for response in context.responses] \
+        == [202] * len(context.responses)
+
+
+@when('the spool is drained, refusing "{subject}"')
+def step_impl(context, subject):
+    from frank.calendar.ingest import ingest_spooled
+    from frank.spool import Spool
+    spool = Spool(context.app.config['FRANK_SPOOL'])
+    with context.app.app_context():
+        refuse_invitation(context, subject)
+        try:
+            ingest_spooled(spool, 100, 'spool')
+        finally:
+            context.db.engine.execute('DROP TRIGGER refuse_invitation')
+    context.spooled = len(spool)
+
+
+@then('I should see an invitation called "{subject}"')
+def step_impl(context, subject):
+    from frank.model import Invitation
+    with context.app.app_context():
+        assert Invitation.query.filter_by(subject=subject).count() == 1
+
+
+@then('I should see {count:d} message left in the spool')
+def step_impl(context, count):
+    assert context.spooled == count, context.spooled
+
+
+@then('I should get back an invitation for each good one')
+def step_impl(context):
+    results = context.batch['results']
+    ids = [result['id'] for result in results if 'id' in result]
+    assert len(ids) == context.batch['count']
+    for result in results:
+        if 'id' in result:
+            response = context.client.get(result['url'])
+            assert response.status_code == 200
+
+
+@then('I should get back an error for the bad one')
+def step_impl(context):
+    results = context.batch['results']
+    errors = [result['index'] for result in results if 'error' in result]
+    assert errors == [context.batch['bad']], errors
+
+
+def error_counts(context):
+    """This flushes the error reports and returns their counts."""
+    from frank.errors import ERRORS
+    from frank.model import ErrorReport
+
+    with context.app.app_context():
+        ERRORS.flush()
+        return dict(
+            context.db.session.query(
+                ErrorReport.fingerprint, ErrorReport.count,
+            )
+        )
+
+
+@when('I send him {count:d} invitations with different bad times')
+def step_impl(context, count):
+    context.error_counts = error_counts(context)
+    for n in range(count):
+        message = email_data(
+            'err8n@eservices.virginia.edu', ['frankbot@cloudmailin.com'],
+            'Meeting at a bad time {}'.format(n), '', 'sometime {}'.format(n),
+        )
+        with context.app.app_context():
+            response = context.client.post(
+                '/calendar/invites/incoming/batch',
+                data=json.dumps([message]),
+                content_type='application/json',
+            )
+        assert response.status_code == 200
+
+
+@then('I should see one error report for them, counted {count:d} times')
+def step_impl(context, count):
+    before = context.error_counts
+    after = error_counts(context)
+    changed = {
+        key: value - before.get(key, 0) for (key, value) in after.items()
+        if value != before.get(key, 0)
+    }
+    assert list(changed.values()) == [count], changed
+
+
+@when('I list {userid}\'s invitations {limit:d} at a time')
+def step_impl(context, userid, limit):
+    url = '/calendar/invites?attendee={}&limit={}'.format(userid, limit)
+    context.pages = []
+    while url:
+        response = context.client.get(url)
+        assert response.status_code == 200
+        page = json.loads(response.data)
+        assert len(page['invitations']) <= limit
+        context.pages.append(page['invitations'])
+        url = page['next']
+
+
+@then('I should see each invitation in the batch once')
+def step_impl(context):
+    listed = [
+        invitation['id'] for page in context.pages for invitation in page
+    ]
+    assert len(listed) == len(set(listed))
+    for result in context.batch['results']:
+        if 'id' in result:
+            assert result['id'] in listed
+
+
 @when('I visit the invitation\'s page')
 def step_impl(context):
     data = json.loads(context.post_email['response'].data)
     url = '/calendar/invites/{id}'.format(**data)
     response = context.client.get(url)
+    context.post_email['url'] = url
     assert response.status_code == 200, '<{}> status = [{}] {}'.format(
         url, response.status_code, response.status,
     )
@@ -189,6 +572,317 @@ def step_impl(context, meeting_time, start_time, duration, start_date):
     )
 
 
+CALENDAR_PART = (
+    'BEGIN:VCALENDAR\r\n'
+    'VERSION:2.0\r\n'
+    'BEGIN:VEVENT\r\n'
+    'UID:{dtstart}@frank\r\n'
+    'DTSTART:{dtstart}\r\n'
+    'DURATION:PT1H\r\n'
+    '{rrule}'
+    'ORGANIZER:mailto:err8n@virginia.edu\r\n'
+    'END:VEVENT\r\n'
+    'END:VCALENDAR\r\n'
+)
+
+
+def post_calendar_part(context, subject, dtstart, rrule, zone):
+    """\
+    This posts an invitation with a calendar part, ingesting it with the
+    local time zone set to `zone`, and keeps the new invitation's ID.
+    """
+    data = email_data(
+        'err8n@eservices.virginia.edu', ['frankbot@cloudmailin.com'],
+        subject, '', 'whenever',
+    )
+    data['attachment1'] = (
+        io.BytesIO(CALENDAR_PART.format(dtstart=dtstart, rrule=rrule)
+                   .encode('utf8')),
+        'invite.ics', 'text/calendar',
+    )
+
+    # Local time is whatever this process's is, so ingest it in `zone`.
+    old_zone = os.environ.get('TZ')
+    os.environ['TZ'] = zone
+    time.tzset()
+    try:
+        with context.app.app_context():
+            response = context.client.post(
+                '/calendar/invites/incoming', data=data,
+            )
+    finally:
+        if old_zone is None:
+            del os.environ['TZ']
+        else:
+            os.environ['TZ'] = old_zone
+        time.tzset()
+    assert response.status_code == 200
+    context.invite_id = json.loads(response.data)['id']
+
+
+@when('I send him a calendar part for a meeting every {byday} from '
+      '{dtstart}, in {zone}')
+def step_impl(context, byday, dtstart, zone):
+    post_calendar_part(
+        context, 'Calendar meeting every {} from {}'.format(byday, dtstart),
+        dtstart, 'RRULE:FREQ=WEEKLY;BYDAY={}\r\n'.format(byday), zone,
+    )
+
+
+@when('I send him a calendar part for a meeting once at {dtstart}, '
+      'in {zone}')
+def step_impl(context, dtstart, zone):
+    post_calendar_part(
+        context, 'Calendar meeting once at {}'.format(dtstart), dtstart, '',
+        zone,
+    )
+
+
+@then('I should see it stored as meeting every {weekday} at {start_time}')
+def step_impl(context, weekday, start_time):
+    from frank.model import Invitation, RecurPeriod
+
+    with context.app.app_context():
+        invitation = Invitation.query.get(context.invite_id)
+        assert invitation.recur == RecurPeriod.weekly
+        assert invitation.recur_param == str(
+            list(calendar.day_name).index(weekday),
+        )
+        stored = invitation.meeting_date.strftime('%A %I:%M %p')
+        assert stored == '{} {}'.format(weekday, start_time), stored
+
+
+@then('I should see it stored as meeting once on {day} at {start_time}')
+def step_impl(context, day, start_time):
+    from frank.model import Invitation, RecurPeriod
+
+    with context.app.app_context():
+        invitation = Invitation.query.get(context.invite_id)
+        assert invitation.recur == RecurPeriod.none
+        stored = invitation.meeting_date.strftime('%A, %B %d at %I:%M %p')
+        assert stored == '{} at {}'.format(day, start_time), stored
+
+
+@when('I ask for the occurrences from {start} to {end}')
+def step_impl(context, start, end):
+    response = context.client.get(
+        '/calendar/occurrences?start={}&end={}'.format(start, end),
+    )
+    assert response.status_code == 200
+    context.occurrences = json.loads(response.data)['occurrences']
+
+
+@then('I should see {count:d} occurrences of it')
+def step_impl(context, count):
+    invite_id = json.loads(context.post_email['response'].data)['id']
+    found = [
+        occurrence for occurrence in context.occurrences
+        if occurrence['invitation_id'] == invite_id
+    ]
+    assert len(found) == count, '{} occurrences'.format(len(found))
+
+
+@when('I visit the invitation\'s page again with its ETag')
+def step_impl(context):
+    response = context.post_email['response']
+    url = context.post_email['url']
+    context.post_email['response'] = context.client.get(
+        url, headers={'If-None-Match': response.headers['ETag']},
+    )
+
+
+@then('I should be told it hasn\'t changed')
+def step_impl(context):
+    response = context.post_email['response']
+    assert response.status_code == 304, response.status
+    assert not response.data
+
+
+@when('its meeting starts')
+def step_impl(context):
+    from frank.model import Invitation
+    data = json.loads(context.post_email['response'].data)
+    with context.app.app_context():
+        invitation = Invitation.query.get(data['id'])
+        invitation.meeting_date = datetime.datetime.now() \
+            - datetime.timedelta(minutes=5)
+        context.db.session.commit()
+
+
+@when('the status scheduler runs')
+def step_impl(context):
+    from frank.consults import catch_up
+    from frank.scheduler import complete_due
+    with context.app.app_context():
+        complete_due()
+        catch_up(recurring=True)
+
+
+def post_daily(context, days):
+    """\
+    This posts an invitation for a meeting every day, starting an hour
+    earlier than now, `days` days ago.
+    """
+    from frank.loadtest import when_line
+    start = datetime.datetime.now() - datetime.timedelta(days=days, hours=1)
+    start = start.replace(second=0, microsecond=0)
+    duration = datetime.timedelta(minutes=30)
+    post_email(
+        context,
+        'err8n@eservices.virginia.edu',
+        ['frankbot@cloudmailin.com', '"Davis Ferrell" <daf2c@virginia.edu>'],
+        ['daf2c'],
+        'Daily meeting',
+        '',
+        (when_line('daily', start, 30), start, duration),
+    )
+
+
+@when('I send him an invitation for a meeting every day since yesterday')
+def step_impl(context):
+    post_daily(context, 1)
+
+
+@when('I send him an invitation for a meeting every day since {days:d} days '
+      'ago')
+def step_impl(context, days):
+    post_daily(context, days)
+
+
+@when('a day goes by')
+def step_impl(context):
+    from frank.model import Invitation
+    data = json.loads(context.post_email['response'].data)
+    day = datetime.timedelta(days=1)
+    with context.app.app_context():
+        invitation = Invitation.query.get(data['id'])
+        invitation.meeting_date -= day
+        for consult in invitation.consults:
+            consult.meeting_date -= day
+        context.db.session.commit()
+
+
+@then('I should see {count:d} consults for it')
+def step_impl(context, count):
+    from frank.model import Consult
+    data = json.loads(context.post_email['response'].data)
+    with context.app.app_context():
+        assert Consult.query.filter_by(from_invitation=data['id']).count() \
+            == count
+
+
+@when('I send him an invitation to a meeting with {userid} yesterday')
+def step_impl(context, userid):
+    when = datetime.datetime.now() - datetime.timedelta(days=1)
+    post_email(
+        context,
+        'err8n@eservices.virginia.edu',
+        ['frankbot@cloudmailin.com', '{}@virginia.edu'.format(userid)],
+        [userid],
+        'Meeting with {}'.format(userid),
+        '',
+        format_when(when.replace(hour=16, minute=0),
+                    datetime.timedelta(minutes=30)),
+    )
+
+
+@when('I ask for {userid}\'s consults by {period}')
+def step_impl(context, userid, period):
+    response = context.client.get(
+        '/calendar/stats?period={}&userid={}'.format(period, userid),
+    )
+    assert response.status_code == 200, response.status
+    context.stats = json.loads(response.data)['stats']
+
+
+@then('I should see {count:d} consult of {minutes:d} minutes')
+def step_impl(context, count, minutes):
+    assert [(row['consults'], row['minutes']) for row in context.stats] \
+        == [(count, minutes)], context.stats
+
+
+@when('I export the invitations')
+def step_impl(context):
+    response = context.client.get('/calendar/export')
+    assert response.status_code == 200, response.status
+    context.exported = [
+        json.loads(line) for line in response.data.decode('utf8').splitlines()
+    ]
+
+
+@then('I should see it in the export')
+def step_impl(context):
+    data = json.loads(context.post_email['response'].data)
+    found = [record for record in context.exported
+             if record['id'] == data['id']]
+    assert len(found) == 1, context.exported
+    assert found[0]['subject'] == context.post_email['subject']
+    assert set(context.post_email['to']) <= set(found[0]['attendees'])
+
+
+@when('I send him another meeting invitation at the same time')
+def step_impl(context):
+    first = json.loads(context.post_email['response'].data)
+    post_email(
+        context,
+        'err8n@eservices.virginia.edu',
+        [
+            'frankbot@cloudmailin.com',
+            '"Davis Ferrell" <daf2c@virginia.edu>',
+        ],
+        ['daf2c'],
+        'This is another subject',
+        '',
+        (context.post_email['data']['plain'].splitlines()[0][len('When: '):],
+         context.post_email['start_time'], context.post_email['duration']),
+    )
+    context.post_email['first'] = first
+
+
+@then('I should see that it conflicts with the first')
+def step_impl(context):
+    soup = context.post_email['soup']
+    url = context.post_email['first']['url']
+    assert url in {a['href'] for a in soup.select('#conflicts a')}
+
+
+@when('I send him the same invitation again')
+def step_impl(context):
+    first = json.loads(context.post_email['response'].data)
+    with context.app.app_context():
+        response = context.client.post(
+            '/calendar/invites/incoming', data=context.post_email['data'],
+        )
+    assert response.status_code == 200
+    context.post_email['first'] = first
+    context.post_email['response'] = response
+
+
+@then('I should get back the first invitation')
+def step_impl(context):
+    data = json.loads(context.post_email['response'].data)
+    assert data['id'] == context.post_email['first']['id']
+    assert data['duplicate']
+
+
+@when('I visit the metrics page')
+def step_impl(context):
+    response = context.client.get('/metrics')
+    assert response.status_code == 200
+    context.metrics = response.data.decode('utf8')
+
+
+@then('I should see timings for the {stage} stage')
+def step_impl(context, stage):
+    assert 'frank_stage_seconds_count{{stage="{}"}}'.format(stage) \
+        in context.metrics
+
+
+@then('I should see a count of created invitations')
+def step_impl(context):
+    assert 'frank_invitations_total{outcome="created"}' in context.metrics
+
+
 @then('I should see my consultation')
 def step_impl(context):
     subject = context.post_email['subject']
@@ -257,13 +951,13 @@ def step_impl(context, status):
 @then('I should see a link to a consultation')
 def step_impl(context):
     soup = context.post_email['soup']
-    assert 'Consult' in {a.string for string in soup.select('a')}
+    assert 'Consult' in {a.string for a in soup.select('a')}
 
 
 @then('I should not see a link to a consultation')
 def step_impl(context):
     soup = context.post_email['soup']
-    assert 'Consult' not in {a.string for string in soup.select('a')}
+    assert 'Consult' not in {a.string for a in soup.select('a')}
 
 
 @then('I should see it marked as recurring')
@@ -0,0 +1,104 @@
+import datetime
+
+from flask import json
+from behave import *
+
+
+def invitation_id(context):
+    return json.loads(context.post_email['response'].data)['id']
+
+
+def profile_id(context, userid):
+    from frank.model import resolve_profiles
+    profile = resolve_profiles([userid])[userid]
+    context.db.session.commit()
+    return profile.id
+
+
+@given('the occurrence table is built')
+def step_impl(context):
+    from frank.occurrences import default_window, rebuild
+    with context.app.app_context():
+        rebuild(*default_window())
+
+
+@when('the occurrence table is built for the last {history:d} days and the '
+      'next {days:d}')
+def step_impl(context, history, days):
+    from frank.occurrences import default_window, rebuild
+    with context.app.app_context():
+        rebuild(*default_window(days, history))
+
+
+@when('the horizon is moved to the last {history:d} days and the next '
+      '{days:d}')
+def step_impl(context, history, days):
+    from frank.occurrences import default_window, extend_horizon
+    with context.app.app_context():
+        extend_horizon(*default_window(days, history))
+
+
+@when('I add {userid} to its attendees')
+def step_impl(context, userid):
+    from frank.model import Invitation
+    with context.app.app_context():
+        invitation = Invitation.query.get(invitation_id(context))
+        invitation.attach_attendees([profile_id(context, userid)])
+        context.db.session.commit()
+
+
+@when('I remove {userid} from its attendees')
+def step_impl(context, userid):
+    from frank.model import Invitation, Profile
+    with context.app.app_context():
+        profile = Profile.query.filter_by(userid=userid).one()
+        context.schedule_version = profile.schedule_version
+        invitation = Invitation.query.get(invitation_id(context))
+        invitation.detach_attendees([profile.id])
+        context.db.session.commit()
+
+
+def stored_count(context, userid):
+    from frank.model import Occurrence
+    with context.app.app_context():
+        return Occurrence.query.filter_by(
+            invitation_id=invitation_id(context),
+            profile_id=profile_id(context, userid),
+        ).count()
+
+
+@then('{userid} should have occurrences of it in the table')
+def step_impl(context, userid):
+    assert stored_count(context, userid) > 0
+
+
+@then('{userid} should not have any occurrences of it in the table')
+def step_impl(context, userid):
+    assert stored_count(context, userid) == 0
+
+
+@then('{userid}\'s schedule should have changed')
+def step_impl(context, userid):
+    from frank.model import Profile
+    with context.app.app_context():
+        profile = Profile.query.filter_by(userid=userid).one()
+        assert profile.schedule_version > context.schedule_version
+
+
+@then('I should see {count:d} of its occurrences in the table, from '
+      '{history:d} days ago')
+def step_impl(context, count, history):
+    from frank.model import Occurrence
+    from frank.occurrences import current_horizon
+    since = datetime.datetime.combine(
+        datetime.date.today() - datetime.timedelta(days=history),
+        datetime.time(),
+    )
+    with context.app.app_context():
+        assert current_horizon().start_time == since
+        starts = {
+            occurrence.start_time for occurrence
+            in Occurrence.query.filter_by(invitation_id=invitation_id(context))
+        }
+        assert len(starts) == count, len(starts)
+        assert min(starts) >= since, min(starts)
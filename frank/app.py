@@ -3,6 +3,8 @@
 """The main entry point for the webapp."""
 
 
+import os
+
 from flask import Flask
 from flask.ext.heroku import Heroku
 from flask_humanize import Humanize
@@ -12,6 +14,27 @@ def create_app():
     app = Flask(__name__)
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+    # If this is set to a file path, incoming invitations are spooled there
+    # and ingested by `manage.py drain_spool` instead of during the request.
+    app.config['FRANK_SPOOL'] = os.environ.get('FRANK_SPOOL')
+
+    # Where attachments are stored, and the largest one that's kept.
+    app.config['FRANK_ATTACHMENTS'] = os.environ.get(
+        'FRANK_ATTACHMENTS', os.path.join(os.getcwd(), 'tmp', 'attachments'),
+    )
+    app.config['FRANK_ATTACHMENT_MAX_BYTES'] = int(os.environ.get(
+        'FRANK_ATTACHMENT_MAX_BYTES', 10 * 1024 * 1024,
+    ))
+
+    # How often, in seconds, error reports are written, and how many
+    # different errors can be waiting before they're written sooner.
+    app.config['FRANK_ERROR_FLUSH'] = float(os.environ.get(
+        'FRANK_ERROR_FLUSH', 5.0,
+    ))
+    app.config['FRANK_ERROR_BUFFER'] = int(os.environ.get(
+        'FRANK_ERROR_BUFFER', 100,
+    ))
+
     heroku = Heroku(app)
     humanize = Humanize(app)
 
@@ -20,8 +43,10 @@ def create_app():
     migrate.init_app(app, db)
 
     from .views.home import homepage
+    from .views.metrics import metrics
     from .calendar.views import calendar
     app.register_blueprint(homepage)
+    app.register_blueprint(metrics)
     app.register_blueprint(calendar, url_prefix='/calendar')
 
     return {
@@ -0,0 +1,231 @@
+"""\
+Importing invitations from mbox or Maildir archives.
+
+Each message is turned into the form fields that the webhook gets, and
+parsed with `parse_message` in a pool of processes. This process is the only
+one that writes, committing a batch at a time while the pool parses the
+next. After each commit, the number of messages done is saved next to the
+archive, so an import that was stopped picks up where it left off. Messages
+that are imported twice are recognized by their dedupe keys anyway.
+"""
+
+
+import email
+import email.policy
+import email.utils
+import io
+import mailbox
+import multiprocessing
+import os
+import time
+import traceback
+
+from frank import attachments, ical
+from frank.calendar.ingest import parse_message, save_batch
+from frank.utils import chunks
+
+
+def open_archive(path):
+    """Open `path` as a Maildir if it's a directory, or as an mbox."""
+    if os.path.isdir(path):
+        return mailbox.Maildir(path, factory=None, create=False)
+    return mailbox.mbox(path, factory=None, create=False)
+
+
+def _store_part(part, store_root, max_bytes):
+    """\
+    This stores a MIME part in the attachment store and returns its metadata,
+    or None if it's too big.
+    """
+    payload = part.get_payload(decode=True) or b''
+    try:
+        (sha256, size) = attachments.store(
+            io.BytesIO(payload), store_root, max_bytes,
+        )
+    except attachments.AttachmentTooLarge:
+        return None
+    return {
+        'sha256': sha256,
+        'filename': part.get_filename(),
+        'content_type': part.get_content_type(),
+        'size': size,
+    }
+
+
+def form_fields(raw, store_root=None, max_bytes=None):
+    """\
+    This turns the bytes of an email into the form fields that the webhook
+    would get for it. Attachments, and calendar parts, are stored under
+    `store_root` if it's given.
+    """
+    message = email.message_from_bytes(raw, policy=email.policy.default)
+    body = message.get_body(preferencelist=('plain',))
+    form = {
+        'envelope[from]': email.utils.parseaddr(message.get('From', ''))[1],
+        'headers[Subject]': str(message.get('Subject', '')),
+        'headers[To]': str(message.get('To', '')),
+        'plain': '' if body is None else body.get_content(),
+        'attachments': [],
+    }
+    message_id = message.get('Message-ID')
+    if message_id:
+        form['headers[Message-ID]'] = str(message_id)
+
+    if store_root is not None:
+        for part in message.walk():
+            if part.is_multipart() or part is body:
+                continue
+            metadata = {
+                'content_type': part.get_content_type(),
+                'filename': part.get_filename(),
+            }
+            if metadata['filename'] or ical.is_calendar(metadata):
+                stored = _store_part(part, store_root, max_bytes)
+                if stored is not None:
+                    form['attachments'].append(stored)
+    return form
+
+
+def parse_raw(task):
+    """\
+    This parses one message in a worker process. `task` is its (index, raw
+    bytes, store root, most bytes for an attachment). It returns (index,
+    message, None) or, if it can't be parsed, (index, None, (error,
+    traceback)).
+    """
+    (index, raw, store_root, max_bytes) = task
+    try:
+        form = form_fields(raw, store_root, max_bytes)
+        return (index, parse_message(form, store_root), None)
+    except Exception as exc:
+        error = '{}: {}'.format(type(exc).__name__, exc)
+        return (index, None, (error, traceback.format_exc()))
+
+
+def read_checkpoint(path):
+    """Return how many messages the checkpoint at `path` says are done."""
+    try:
+        with open(path) as fin:
+            return int(fin.read().strip() or 0)
+    except FileNotFoundError:
+        return 0
+
+
+def write_checkpoint(path, done):
+    """Save the number of messages `done`, replacing the file atomically."""
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as fout:
+        fout.write('{}\n'.format(done))
+    os.replace(temp_path, path)
+
+
+class ImportStats:
+    """The running totals of an import, for progress reports."""
+
+    def __init__(self, done=0):
+        self.started = time.time()
+        self.skipped = done
+        self.done = done
+        self.created = 0
+        self.duplicates = 0
+        self.errors = 0
+
+    def add(self, results):
+        """Count the results of a batch from `save_batch`."""
+        self.done += len(results)
+        for result in results:
+            if 'error' in result:
+                self.errors += 1
+            elif result['duplicate']:
+                self.duplicates += 1
+            else:
+                self.created += 1
+
+    @property
+    def rate(self):
+        """The messages imported a second in this run."""
+        elapsed = time.time() - self.started
+        return (self.done - self.skipped) / elapsed if elapsed else 0.0
+
+    def __str__(self):
+        return ('{} done, {} created, {} duplicate(s), {} error(s), '
+                '{:.1f} messages/s').format(
+                    self.done, self.created, self.duplicates, self.errors,
+                    self.rate,
+                )
+
+
+def save_parsed(parsed, route):
+    """\
+    This saves the results of `parse_raw` for a batch in one transaction,
+    and returns a result dict for each. If the batch can't be committed,
+    the messages are saved one at a time, so only the bad ones fail.
+    """
+    messages = [(index, message) for (index, message, failed) in parsed
+                if failed is None]
+    results = [{'index': index, 'error': failed[0]}
+               for (index, _, failed) in parsed if failed is not None]
+    errors = [
+        {
+            'message': 'error parsing message {} of archive'.format(index),
+            'route': route,
+            'stacktrace': failed[1],
+        }
+        for (index, _, failed) in parsed if failed is not None
+    ]
+    try:
+        results += save_batch(messages, errors, route)
+    except Exception:
+        traceback.print_exc()
+        save_batch([], errors, route)
+        for pair in messages:
+            try:
+                results += save_batch([pair], [], route)
+            except Exception as exc:
+                results.append({
+                    'index': pair[0],
+                    'error': '{}: {}'.format(type(exc).__name__, exc),
+                })
+    results.sort(key=lambda result: result['index'])
+    return results
+
+
+def import_archive(path, store_root=None, max_bytes=None, batch=1000,
+                   processes=None, checkpoint=None, progress=None):
+    """\
+    This imports the messages in the mbox or Maildir at `path`, skipping the
+    ones that its `checkpoint` file says are already done, and returns the
+    `ImportStats`. `progress` is called with them after each batch.
+    """
+    box = open_archive(path)
+    # Maildirs list their messages in any order, so they're sorted to be
+    # sure the checkpoint counts the same ones each time.
+    keys = sorted(box.keys())
+    checkpoint = checkpoint or path.rstrip(os.sep) + '.imported'
+    done = read_checkpoint(checkpoint)
+    route = 'import {}'.format(path)
+    stats = ImportStats(done)
+
+    tasks = (
+        (index, box.get_bytes(key), store_root, max_bytes)
+        for (index, key) in enumerate(keys[done:], done)
+    )
+    with multiprocessing.Pool(processes) as pool:
+        # One batch is parsed while the one before it is written.
+        pending = None
+        for window in chunks(tasks, batch):
+            parsing = pool.map_async(parse_raw, window, chunksize=32)
+            if pending is not None:
+                _write(pending.get(), route, checkpoint, stats, progress)
+            pending = parsing
+        if pending is not None:
+            _write(pending.get(), route, checkpoint, stats, progress)
+    return stats
+
+
+def _write(parsed, route, checkpoint, stats, progress):
+    """Save a parsed batch, then move the checkpoint past it."""
+    stats.add(save_parsed(parsed, route))
+    write_checkpoint(checkpoint, parsed[-1][0] + 1)
+    if progress is not None:
+        progress(stats)
@@ -0,0 +1,64 @@
+"""\
+A content-addressed store for attachments on disk.
+
+Files are streamed in chunks into `<root>/<sha[:2]>/<sha>`, where `sha` is
+the SHA-256 of their contents, so the same attachment sent with many invites
+is only kept once.
+"""
+
+
+import hashlib
+import os
+import tempfile
+
+
+CHUNK_SIZE = 64 * 1024
+
+
+class AttachmentTooLarge(Exception):
+    """Raised when an attachment is bigger than the store allows."""
+
+
+def path_for(root, sha256):
+    """Return where the file with this hash is stored under `root`."""
+    return os.path.join(root, sha256[:2], sha256)
+
+
+def store(stream, root, max_bytes):
+    """\
+    This copies `stream` into the store under `root`, a chunk at a time, and
+    returns its (SHA-256, size). If it's bigger than `max_bytes`, nothing is
+    stored and this raises AttachmentTooLarge.
+    """
+    os.makedirs(root, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+
+    handle, temp_path = tempfile.mkstemp(dir=root, prefix='.incoming-')
+    try:
+        with os.fdopen(handle, 'wb') as fout:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise AttachmentTooLarge(
+                        'attachment is over {} bytes'.format(max_bytes),
+                    )
+                digest.update(chunk)
+                fout.write(chunk)
+
+        sha256 = digest.hexdigest()
+        path = path_for(root, sha256)
+        if os.path.exists(path):
+            os.remove(temp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(temp_path, path)
+    except:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    return (sha256, size)
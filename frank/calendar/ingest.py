@@ -0,0 +1,490 @@
+"""Turning incoming mail into invitations."""
+
+
+import collections
+import datetime
+import email.utils
+import hashlib
+import itertools
+import re
+import traceback
+
+from flask import abort
+
+from frank import attachments, ical
+from frank.metrics import timed, INVITATIONS, WHEN_SOURCES
+from frank.model import (
+    db, encode_recur_param, find_invitations, insert_or_create, insert_rows,
+    invitation_attendees, resolve_profiles, Attachment, Invitation, Profile,
+    MeetingTime,
+)
+from frank.conflicts import record_conflicts, ConflictCheck
+from frank.consults import make_consults
+from frank.errors import ERRORS
+from frank.occurrences import refresh_occurrences
+
+
+# Every match would also match from the start of its word, so not starting
+# in the middle of one finds the same IDs without trying every position.
+ATTENDEE_REGEXEN = [
+    re.compile(r'(?<![a-z]) (?P<userid> [a-z]+ (?: \d [a-z]+ )? ) @',
+               re.VERBOSE),
+]
+
+
+def merge_patterns(regexen):
+    """\
+    This combines regexes that each have a `userid` group into one scanner, so
+    text only has to be scanned once however many patterns there are. They
+    all have to use the same flags. This returns the scanner and the names
+    its `userid` groups were renamed to.
+    """
+    flags = {regex.flags for regex in regexen}
+    if len(flags) != 1:
+        raise ValueError('attendee regexes have different flags')
+
+    names = []
+    alternatives = []
+    for i, regex in enumerate(regexen):
+        name = 'userid{}'.format(i)
+        names.append(name)
+        alternatives.append('(?:{})'.format(
+            regex.pattern.replace('(?P<userid>', '(?P<{}>'.format(name)),
+        ))
+
+    return (re.compile('|'.join(alternatives), flags.pop()), tuple(names))
+
+
+(ATTENDEE_SCANNER, USERID_GROUPS) = merge_patterns(ATTENDEE_REGEXEN)
+
+
+def profile(userid):
+    """Create and return a profile that's been added to the session."""
+    prof = Profile(userid=userid)
+    db.session.add(prof)
+    return prof
+
+
+def add_profile(profile_index, userid):
+    """This creates a user and adds it to the database and the index."""
+    return insert_or_create(profile_index, userid, lambda: profile(userid))
+
+
+def recipient_userids(form):
+    """This returns the userids from the headers[To] entry in the form."""
+    to_emails = email.utils.getaddresses(
+        form.get('headers[To]', '').split(','),
+        )
+    return [address.split('@')[0] for _, address in to_emails]
+
+
+def read_recipients(form, index):
+    """This reads all the envelope[recipients][N] entries from the form."""
+    return [add_profile(index, userid) for userid in recipient_userids(form)]
+
+
+def when_line(body):
+    """This returns the text of the 'When:' line in the body, or None."""
+    for line in body.splitlines():
+        if line.lower().startswith('when: '):
+            return line[6:]
+    return None
+
+
+def parse_when(body):
+    """This parses the 'When:' line in the body."""
+    line = when_line(body)
+    if line is None:
+        abort(400)
+
+    return MeetingTime.parse(line)
+
+
+def read_meeting_time(form, store_root=None):
+    """\
+    This returns a message's MeetingTime and the userids from its calendar
+    part. If the message has a text/calendar attachment in the store under
+    `store_root`, that's used; otherwise the When line in the body is.
+    """
+    if store_root is not None:
+        for attachment in form.get('attachments') or []:
+            if not ical.is_calendar(attachment):
+                continue
+            path = attachments.path_for(store_root, attachment['sha256'])
+            try:
+                with open(path, 'rb') as fin:
+                    (parsed, userids) = ical.parse(fin.read())
+            except Exception:
+                WHEN_SOURCES.inc('ical_failed')
+                break
+            WHEN_SOURCES.inc('ical')
+            return (MeetingTime.from_parsed(parsed), userids)
+
+    WHEN_SOURCES.inc('text')
+    return (parse_when(form['plain']), [])
+
+
+def dedupe_key(form):
+    """\
+    This returns the key that identifies a message across retries and
+    re-sends. It comes from the Message-ID header if the relay passed it on,
+    and otherwise from the sender, subject, When line, and body.
+    """
+    message_id = form.get('headers[Message-ID]', '').strip()
+    if message_id:
+        parts = ['message-id', message_id]
+    else:
+        parts = [
+            'content',
+            form['envelope[from]'],
+            form['headers[Subject]'],
+            when_line(form['plain']) or '',
+            form['plain'],
+        ]
+    return hashlib.sha256('\0'.join(parts).encode('utf8')).hexdigest()
+
+
+def scan_userids(text, scanner=ATTENDEE_SCANNER, groups=USERID_GROUPS):
+    """This yields the UVa computing IDs in the text, in order."""
+    for match in scanner.finditer(text):
+        for group in groups:
+            userid = match.group(group)
+            if userid is not None:
+                yield userid
+                break
+
+
+def attendee_userids(text):
+    """This returns the UVa computing IDs in the text, in order."""
+    return list(scan_userids(text))
+
+
+def participant_userids(form, scanner=ATTENDEE_SCANNER,
+                        groups=USERID_GROUPS):
+    """\
+    This returns the userids of everyone in the To header, and then everyone
+    mentioned in the subject and body, in order and without repeats. It makes
+    one pass over each.
+    """
+    userids = []
+    seen = set()
+    texts = (form['headers[Subject]'], form['plain'])
+
+    for userid in itertools.chain(
+            recipient_userids(form),
+            *(scan_userids(text, scanner, groups) for text in texts)):
+        if userid not in seen:
+            seen.add(userid)
+            userids.append(userid)
+
+    return userids
+
+
+def read_attendee(attendee_set, index, text):
+    """This scans the text for a UVa computing ID."""
+    attendees = []
+
+    for userid in scan_userids(text):
+        if userid not in attendee_set:
+            attendee_set.add(userid)
+            prof = add_profile(index, userid)
+            attendees.append(prof)
+
+    return attendees
+
+
+def store_attachments(files, root, max_bytes, log):
+    """\
+    This streams uploaded files into the attachment store and returns a list
+    of their metadata, ready to be `Attachment` rows. Files over `max_bytes`
+    are logged and dropped.
+    """
+    stored = []
+    for file_value in files.values():
+        try:
+            (sha256, size) = attachments.store(
+                file_value.stream, root, max_bytes,
+            )
+        except attachments.AttachmentTooLarge as exc:
+            log.warning('dropping attachment %r: %s', file_value.filename, exc)
+            continue
+        log.info('stored attachment %r (%s, %d bytes) as %s',
+                 file_value.filename, file_value.content_type, size, sha256)
+        stored.append({
+            'sha256': sha256,
+            'filename': file_value.filename,
+            'content_type': file_value.content_type,
+            'size': size,
+        })
+    return stored
+
+
+def meeting_status(meeting_date):
+    """This returns the status for a new invitation meeting at this time."""
+    if meeting_date < datetime.datetime.now(meeting_date.tzinfo):
+        return 1
+    else:
+        return 0
+
+
+def parse_message(form, store_root=None):
+    """\
+    This parses one message's form fields into a dict of everything needed to
+    create its invitation. It doesn't touch the database.
+
+    If the form has already been through `store_attachments`, its
+    `attachments` entry is the list of their metadata, and a calendar part
+    among them in the store under `store_root` is used for the meeting time.
+    """
+    owner = form['envelope[from]'].split('@')[0]
+    subject = form['headers[Subject]']
+    body = form['plain']
+    with timed('parse'):
+        (meeting_time, calendar_userids) = read_meeting_time(form, store_root)
+
+    with timed('attendees'):
+        attendees = participant_userids(form)
+        attendee_set = set(attendees)
+        attendee_set.add(owner)
+        for userid in calendar_userids:
+            if userid not in attendee_set:
+                attendee_set.add(userid)
+                attendees.append(userid)
+
+    return {
+        'owner': owner,
+        'subject': subject,
+        'body': body,
+        'meeting_time': meeting_time,
+        'attendees': attendees,
+        'dedupe_key': dedupe_key(form),
+        'attachments': form.get('attachments') or [],
+    }
+
+
+def participant_ids(message, profiles):
+    """\
+    This returns the profile IDs of a message's owner and attendees, from an
+    index from `resolve_profiles`.
+    """
+    userids = [message['owner']] + list(message['attendees'])
+    return list(collections.OrderedDict.fromkeys(
+        profiles[userid].id for userid in userids
+    ))
+
+
+def insert_invitations(messages, checker=None):
+    """\
+    This inserts invitations for a list of messages from `parse_message`,
+    resolving all of their profiles at once, writing the invitations in a
+    single executemany and then reading their IDs back in one query by
+    dedupe key, and writing the attendee rows in as few INSERTs as it can.
+    Messages that have already been ingested, or that
+    are repeated in the list, aren't inserted again. Each new invitation is
+    checked for conflicts with `checker`, a `ConflictCheck`; call its
+    `committed` after committing.
+
+    It returns a list of (ID, created) pairs, in order.
+    """
+    keys = [message['dedupe_key'] for message in messages]
+    existing = find_invitations(keys)
+    created = {}
+    new_messages = []
+    for message in messages:
+        key = message['dedupe_key']
+        if key not in existing and key not in created:
+            created[key] = None
+            new_messages.append(message)
+    messages = new_messages
+
+    userids = set()
+    for message in messages:
+        userids.add(message['owner'])
+        userids.update(message['attendees'])
+    with timed('profiles'):
+        profiles = resolve_profiles(userids)
+
+    if checker is None:
+        checker = ConflictCheck()
+    participants = [participant_ids(message, profiles) for message in messages]
+    with timed('conflicts'):
+        checker.load(profile.id for profile in profiles.values())
+
+    rows = []
+    for message in messages:
+        meeting_time = message['meeting_time']
+        rows.append({
+            'subject': message['subject'],
+            'body': message['body'],
+            'status': meeting_status(meeting_time.start_time),
+            'meeting_date': meeting_time.start_time,
+            'duration': round(meeting_time.duration.total_seconds() / 60.0),
+            'recur': meeting_time.recur,
+            'recur_param': encode_recur_param(
+                meeting_time.recur, meeting_time.recur_param,
+            ),
+            'owner_id': profiles[message['owner']].id,
+            'dedupe_key': message['dedupe_key'],
+        })
+    with timed('insert'):
+        # Asking for each row's `id` back would make this one INSERT for
+        # each row, so they're looked up by their unique dedupe keys after.
+        if rows:
+            db.session.execute(Invitation.__table__.insert(), rows)
+        ids = find_invitations(row['dedupe_key'] for row in rows)
+        for row in rows:
+            row['id'] = ids[row['dedupe_key']]
+
+        attendee_rows = [
+            {'invitation_id': row['id'], 'profile_id': profiles[userid].id}
+            for row, message in zip(rows, messages)
+            for userid in message['attendees']
+        ]
+        insert_rows(invitation_attendees, attendee_rows)
+
+        attachment_rows = [
+            dict(attachment, invitation_id=row['id'])
+            for row, message in zip(rows, messages)
+            for attachment in message['attachments']
+        ]
+        if attachment_rows:
+            db.session.execute(Attachment.__table__.insert(), attachment_rows)
+
+    with timed('conflicts'):
+        for (row, message, profile_ids) in zip(rows, messages, participants):
+            intervals = checker.intervals(message['meeting_time'])
+            record_conflicts(
+                row['id'], checker.check(row['id'], intervals, profile_ids),
+            )
+
+    with timed('occurrences'):
+        refresh_occurrences([row['id'] for row in rows])
+
+    with timed('consults'):
+        make_consults([row['id'] for row in rows])
+
+    for row in rows:
+        created[row['dedupe_key']] = row['id']
+    results = []
+    seen = set()
+    for key in keys:
+        if key in existing:
+            results.append((existing[key], False))
+        else:
+            # Only the first of any repeats in the list was created.
+            results.append((created[key], key not in seen))
+            seen.add(key)
+    return results
+
+
+def save_batch(parsed, errors, route):
+    """\
+    This inserts the (index, message) pairs in `parsed`, from
+    `parse_message`, in one transaction, and once that's committed, reports
+    the `errors`, each a dict of the arguments to `ERRORS.report`. It
+    returns a result dict for each message, as `ingest_batch` does.
+    """
+    checker = ConflictCheck()
+    try:
+        ids = insert_invitations([message for _, message in parsed], checker)
+        with timed('commit'):
+            db.session.commit()
+    except:
+        INVITATIONS.inc('error', len(parsed))
+        db.session.rollback()
+        ERRORS.report(
+            message='error creating invitations',
+            route=route,
+            stacktrace=traceback.format_exc(),
+        )
+        raise
+    checker.committed()
+    for error in errors:
+        ERRORS.report(**error)
+
+    INVITATIONS.inc('created', sum(1 for _, created in ids if created))
+    INVITATIONS.inc('duplicate', sum(1 for _, created in ids if not created))
+    INVITATIONS.inc('invalid', len(errors))
+    return [
+        {
+            'index': index,
+            'id': invite_id,
+            'duplicate': not created,
+        }
+        for (index, _), (invite_id, created) in zip(parsed, ids)
+    ]
+
+
+def ingest_batch(forms, route, store_root=None):
+    """\
+    This parses a batch of messages' form fields and inserts the ones that
+    parse in one transaction. Entries in `forms` that are exceptions are
+    reported as failures. Failures are recorded as `ErrorReport`s without
+    stopping the rest of the batch. `store_root` is passed on to
+    `parse_message`.
+
+    It returns a list of dicts with the `index` of each message in `forms` and
+    either the invitation's `id` and whether it's a `duplicate` of one that
+    was already there, or the `error`.
+    """
+    results = []
+    parsed = []
+    errors = []
+
+    for index, form in enumerate(forms):
+        try:
+            if isinstance(form, Exception):
+                raise form
+            parsed.append((index, parse_message(form, store_root)))
+        except Exception as exc:
+            results.append({
+                'index': index,
+                'error': '{}: {}'.format(type(exc).__name__, exc),
+            })
+            errors.append({
+                'message': 'error parsing invitation {} of batch'.format(
+                    index,
+                ),
+                'route': route,
+                'stacktrace': traceback.format_exc(),
+            })
+
+    results += save_batch(parsed, errors, route)
+    results.sort(key=lambda result: result['index'])
+
+    return results
+
+
+def ingest_spooled(spool, limit, route, store_root=None):
+    """\
+    This claims up to `limit` payloads from `spool`, ingests them with
+    `ingest_batch`, and removes the ones that were handled. It returns their
+    results and the number left in the spool to try again, or None if
+    nothing was waiting.
+    """
+    claimed = spool.claim(limit)
+    if not claimed:
+        return None
+
+    payloads = [payload for _, payload in claimed]
+    try:
+        results = ingest_batch(payloads, route, store_root)
+        handled = [spool_id for spool_id, _ in claimed]
+    except Exception:
+        # Something in the batch broke the insert. Go one at a time, and
+        # leave the ones that still can't be inserted in the spool, to be
+        # tried again once their claims expire. Only the ones that were
+        # committed, or that don't parse, are removed.
+        traceback.print_exc()
+        results = []
+        handled = []
+        for (spool_id, payload) in claimed:
+            try:
+                results += ingest_batch([payload], route, store_root)
+            except Exception:
+                traceback.print_exc()
+            else:
+                handled.append(spool_id)
+
+    spool.remove(handled)
+    return (results, len(claimed) - len(handled))
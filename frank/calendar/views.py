@@ -2,78 +2,135 @@
 
 
 import datetime
-import email.utils
-import re
+import time
 import traceback
 
 from flask import (
-    abort, current_app, json, render_template, request, url_for, Blueprint
+    abort, current_app, json, render_template, request, stream_with_context,
+    url_for, Blueprint
 )
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, subqueryload
 
+from frank import export as exporting, rollups
+from frank.conflicts import record_conflicts, ConflictCheck
+from frank.consults import make_consults
+from frank.errors import ERRORS
+from frank.metrics import timed, INVITATIONS
 from frank.model import (
-    db, insert_or_create, ErrorReport, Invitation, Profile, RecurPeriod,
-    MeetingTime,
+    db, encode_recur_param, find_invitations, insert_rows, resolve_profiles,
+    Attachment, Conflict, Consult, Invitation, invitation_attendees,
+    PAGE_CACHE, Profile, RecurPeriod, ROLLUP_PERIODS,
+)
+from frank.occurrences import occurrences_between, refresh_occurrences
+from frank.spool import Spool
+from .ingest import (
+    add_profile, ingest_batch, meeting_status, parse_message, participant_ids,
+    store_attachments, when_line,
 )
-
-
-ATTENDEE_REGEXEN = [
-    re.compile(r'(?P<userid> [a-z]+ (?: \d [a-z]+ )? ) @', re.VERBOSE),
-]
 
 
 calendar = Blueprint('calendar', __name__, template_folder='templates')
 
 
-def profile(userid):
-    """Create and return a profile that's been added to the session."""
-    prof = Profile(userid=userid)
-    db.session.add(prof)
-    return prof
-
-
-def add_profile(profile_index, userid):
-    """This creates a user and adds it to the database and the index."""
-    return insert_or_create(profile_index, userid, lambda: profile(userid))
-
-
-def read_recipients(form, index):
-    """This reads all the envelope[recipients][N] entries from the form."""
-    attendees = []
-    to_emails = email.utils.getaddresses(
-        form.get('headers[To]', '').split(','),
-        )
-    for _, address in to_emails:
-        userid = address.split('@')[0]
-        attendees.append(add_profile(index, userid))
+def current_spool():
+    """This returns the app's `Spool`, or None if it isn't spooling."""
+    path = current_app.config.get('FRANK_SPOOL')
+    if not path:
+        return None
+    spool = current_app.extensions.get('frank_spool')
+    if spool is None or spool.path != path:
+        spool = current_app.extensions['frank_spool'] = Spool(path)
+    return spool
 
-    return attendees
 
-
-def parse_when(body):
-    """This parses the 'When:' line in the body."""
-    for line in body.splitlines():
-        if line.lower().startswith('when: '):
-            meeting_time = MeetingTime.parse(line[6:])
-            break
-    else:
+def spool_incoming(spool, incoming):
+    """\
+    This checks that a message has what we need and spools it for the worker.
+    """
+    if not all(incoming.get(field) is not None
+               for field in ('envelope[from]', 'headers[Subject]', 'plain')):
+        abort(400)
+    if when_line(incoming['plain']) is None:
         abort(400)
 
-    return meeting_time
+    spool_id = spool.append(incoming)
+    response = json.jsonify(status=0, spooled=spool_id)
+    response.status_code = 202
+    return response
 
 
-def read_attendee(attendee_set, index, text):
-    """This scans the text for a UVa computing ID."""
-    attendees = []
+def create_invitation(message):
+    """\
+    This creates and commits the invitation for a message from
+    `parse_message`. It returns the invitation's ID and whether it was
+    created, which it won't be if another request with the same message got
+    committed first.
+    """
+    meeting_time = message['meeting_time']
+    meeting_date = meeting_time.start_time
+    duration = meeting_time.duration
+    status = meeting_status(meeting_date)
+
+    with timed('profiles'):
+        profiles = resolve_profiles([message['owner']] + message['attendees'])
+    profile_ids = participant_ids(message, profiles)
+    checker = ConflictCheck()
+    with timed('conflicts'):
+        checker.load(profile_ids)
+    owner = add_profile(profiles, message['owner'])
+    attendee_ids = [
+        add_profile(profiles, userid).id for userid in message['attendees']
+    ]
 
-    for regex in ATTENDEE_REGEXEN:
-        for match in regex.finditer(text):
-            userid = match.group('userid')
-            if userid not in attendee_set:
-                attendee_set.add(userid)
-                prof = add_profile(index, userid)
-                attendees.append(prof)
+    invitation = Invitation(
+        subject=message['subject'],
+        body=message['body'],
+        status=status,
+        meeting_date=meeting_date,
+        duration=round(duration.total_seconds() / 60.0),
+        recur=meeting_time.recur,
+        recur_param=encode_recur_param(
+            meeting_time.recur, meeting_time.recur_param,
+        ),
+        owner=owner,
+        attachments=[
+            Attachment(**attachment) for attachment in message['attachments']
+        ],
+        dedupe_key=message['dedupe_key'],
+    )
 
-    return attendees
+    db.session.add(invitation)
+    try:
+        db.session.flush()
+        # It's new, so there are no attendees to skip, and it's refreshed
+        # below.
+        insert_rows(invitation_attendees, [
+            {'invitation_id': invitation.id, 'profile_id': profile_id}
+            for profile_id in sorted(set(attendee_ids))
+        ])
+        with timed('conflicts'):
+            intervals = checker.intervals(meeting_time)
+            record_conflicts(
+                invitation.id,
+                checker.check(invitation.id, intervals, profile_ids),
+            )
+        with timed('occurrences'):
+            refresh_occurrences([invitation.id])
+        with timed('consults'):
+            make_consults([invitation.id])
+        with timed('commit'):
+            db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        key = message['dedupe_key']
+        invite_id = find_invitations([key]).get(key)
+        if invite_id is None:
+            raise
+        return (invite_id, False)
+    checker.committed()
+    return (invitation.id, True)
 
 
 @calendar.route('/invites/incoming', methods=['POST'])
@@ -82,71 +139,451 @@ def invites_incoming():
     Gets an invitation from a POST request, adds it to the db, and returns its
     ID.
     """
-    incoming = request.form
-    import pprint
-    pprint.pprint(incoming)
-    print('{} files'.format(len(request.files)))
-    for file_value in request.files.values():
-        print(file_value.filename)
-        print(file_value.read())
-        print()
+    incoming = request.form.to_dict()
+    with timed('attachments'):
+        incoming['attachments'] = store_attachments(
+            request.files,
+            current_app.config['FRANK_ATTACHMENTS'],
+            current_app.config['FRANK_ATTACHMENT_MAX_BYTES'],
+            current_app.logger,
+        )
+
+    spool = current_spool()
+    if spool is not None:
+        return spool_incoming(spool, incoming)
 
     with current_app.app_context():
         try:
-            profiles = {p.userid: p for p in db.session.query(Profile)}
-            key = incoming['envelope[from]'].split('@')[0]
-            owner = insert_or_create(profiles, key, lambda: profile(key))
-            attendees = read_recipients(incoming, profiles)
-            attendee_set = set(attendee.userid for attendee in attendees)
-            subject = incoming['headers[Subject]']
-            body = incoming['plain']
-            meeting_time = parse_when(body)
-            meeting_date = meeting_time.start_time
-            duration = meeting_time.duration
-            attendees += read_attendee(attendee_set, profiles, subject) \
-                + read_attendee(attendee_set, profiles, body)
-            if meeting_date < datetime.datetime.now(meeting_date.tzinfo):
-                status = 1
-            else:
-                status = 0
-
-            invitation = Invitation(
-                subject=subject,
-                body=body,
-                status=status,
-                meeting_date=meeting_date,
-                duration=round(duration.total_seconds() / 60.0),
-                owner=owner,
-                attendees=attendees,
+            message = parse_message(
+                incoming, current_app.config['FRANK_ATTACHMENTS'],
             )
-
-            db.session.add(invitation)
-            db.session.commit()
+            key = message['dedupe_key']
+            invite_id = find_invitations([key]).get(key)
+            if invite_id is None:
+                (invite_id, created) = create_invitation(message)
+                duplicate = not created
+            else:
+                duplicate = True
         except:
+            INVITATIONS.inc('error')
             db.session.rollback()
-            db.session.add(ErrorReport(
+            ERRORS.report(
                 message='error creating invitation',
                 route='calendar /invites/incoming/',
                 stacktrace=traceback.format_exc(),
-            ))
-            db.session.commit()
+            )
             raise
 
+        INVITATIONS.inc('duplicate' if duplicate else 'created')
         return json.jsonify(
             status=1,
-            id=invitation.id,
-            url=url_for('.invite', invite_id=invitation.id),
+            id=invite_id,
+            url=url_for('.invite', invite_id=invite_id),
+            duplicate=duplicate,
             )
 
 
+def read_batch():
+    """\
+    This reads the messages in a batch request. The body is either a JSON
+    array or newline-delimited JSON, with each message an object holding the
+    same fields as a single incoming message. Messages that can't be decoded
+    are returned as the exception.
+    """
+    data = request.get_data(as_text=True)
+    if request.mimetype == 'application/json':
+        try:
+            messages = json.loads(data)
+        except ValueError:
+            abort(400)
+        if not isinstance(messages, list):
+            messages = [messages]
+        return messages
+
+    messages = []
+    for line in data.splitlines():
+        if line.strip():
+            try:
+                messages.append(json.loads(line))
+            except ValueError as exc:
+                messages.append(exc)
+    return messages
+
+
+@calendar.route('/invites/incoming/batch', methods=['POST'])
+def invites_incoming_batch():
+    """\
+    Gets a batch of invitations from a POST request, adds the ones that parse
+    to the db in one transaction, and returns each one's ID or error. If the
+    transaction fails, the messages are added one at a time, so only the bad
+    ones fail.
+    """
+    route = 'calendar /invites/incoming/batch/'
+    store_root = current_app.config['FRANK_ATTACHMENTS']
+    with current_app.app_context():
+        forms = read_batch()
+        try:
+            results = ingest_batch(forms, route, store_root)
+        except Exception:
+            current_app.logger.exception('batch failed, retrying singly')
+            results = []
+            for (index, form) in enumerate(forms):
+                try:
+                    (result,) = ingest_batch([form], route, store_root)
+                except Exception as exc:
+                    # Database errors carry the statement and its
+                    # parameters, so this only gives the driver's message.
+                    result = {'error': '{}: {}'.format(
+                        type(exc).__name__, getattr(exc, 'orig', exc),
+                    )}
+                result['index'] = index
+                results.append(result)
+        for result in results:
+            if 'id' in result:
+                result['url'] = url_for('.invite', invite_id=result['id'])
+
+        return json.jsonify(status=1, results=results)
+
+
+# The formats accepted for the `start` and `end` of a window.
+TIMESTAMP_FORMATS = ('%Y-%m-%dT%H:%M:%S', '%Y-%m-%dT%H:%M', '%Y-%m-%d')
+
+# The longest window that /occurrences will expand.
+MAX_WINDOW = datetime.timedelta(days=366)
+
+
+def read_timestamp(name, required=True):
+    """\
+    This reads an ISO 8601 date or date and time from the query string
+    argument `name`, or aborts with 400. If it isn't `required`, this returns
+    None when it's missing.
+    """
+    value = request.args.get(name, '')
+    if not value and not required:
+        return None
+    for date_format in TIMESTAMP_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, date_format)
+        except ValueError:
+            pass
+    abort(400)
+
+
+def find_profile_id(userid):
+    """Return the ID of the profile for `userid`, or None."""
+    found = db.session.query(Profile.id).filter(Profile.userid == userid) \
+        .first()
+    return None if found is None else found[0]
+
+
+@calendar.route('/occurrences')
+def occurrences():
+    """\
+    Lists the occurrences of all the invitations that aren't canceled, from
+    the `start` up to the `end` in the query string. If `userid` is given,
+    this only lists the ones that person is part of.
+    """
+    start = read_timestamp('start')
+    end = read_timestamp('end')
+    if not start < end <= start + MAX_WINDOW:
+        abort(400)
+
+    with current_app.app_context():
+        profile_id = None
+        userid = request.args.get('userid')
+        if userid:
+            profile_id = find_profile_id(userid)
+            if profile_id is None:
+                return json.jsonify(occurrences=[])
+
+        with timed('occurrences'):
+            found = occurrences_between(start, end, profile_id)
+        return json.jsonify(occurrences=[
+            {
+                'invitation_id': occurrence.invitation_id,
+                'start': occurrence.start.isoformat(),
+                'end': occurrence.end.isoformat(),
+                'url': url_for('.invite', invite_id=occurrence.invitation_id),
+            }
+            for occurrence in found
+        ])
+
+
+@calendar.route('/stats')
+def stats():
+    """\
+    Lists the number of consults and their total time for each person in
+    each `period` (day, week, or month) that starts from `start` up to `end`.
+    These default to the last twelve periods. If `userid` is given, this
+    only lists that person's.
+    """
+    period = request.args.get('period', 'week')
+    if period not in ROLLUP_PERIODS:
+        abort(400)
+    (start, end) = rollups.default_range(period)
+    start = read_timestamp('start', required=False) or start
+    end = read_timestamp('end', required=False) or end
+    if isinstance(start, datetime.datetime):
+        start = start.date()
+    if isinstance(end, datetime.datetime):
+        end = end.date()
+    if not start < end <= start + MAX_WINDOW:
+        abort(400)
+
+    with current_app.app_context():
+        profile_id = None
+        userid = request.args.get('userid')
+        if userid:
+            profile_id = find_profile_id(userid)
+            if profile_id is None:
+                return json.jsonify(period=period, stats=[])
+
+        with timed('stats'):
+            rows = rollups.stats(period, start, end, profile_id)
+        return json.jsonify(period=period, stats=[
+            {
+                'userid': row.userid,
+                'start': row.period_start.isoformat(),
+                'consults': row.consults,
+                'minutes': row.minutes,
+            }
+            for row in rows
+        ])
+
+
+@calendar.route('/export')
+def export():
+    """\
+    Streams all of the invitations, or with `kind=consults` all of the
+    consults, as NDJSON, or as CSV with `format=csv`.
+    """
+    kind = request.args.get('kind', 'invitations')
+    output_format = request.args.get('format', 'ndjson')
+    if (kind not in exporting.KINDS or
+            output_format not in exporting.FORMATS):
+        abort(400)
+
+    response = current_app.response_class(
+        stream_with_context(exporting.export(kind, output_format)),
+        mimetype=exporting.CONTENT_TYPES[output_format],
+    )
+    response.headers['Content-Disposition'] = \
+        'attachment; filename={}.{}'.format(kind, output_format)
+    return response
+
+
+# How many invitations /invites lists on a page, by default and at most.
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Cursors keep the microseconds, so they land exactly on the last row.
+CURSOR_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+
+def read_cursor():
+    """\
+    This reads the `after` cursor, '<meeting date>,<ID>', from the query
+    string. It's None for the first page.
+    """
+    value = request.args.get('after')
+    if not value:
+        return None
+    try:
+        (timestamp, invite_id) = value.rsplit(',', 1)
+        return (datetime.datetime.strptime(timestamp, CURSOR_FORMAT),
+                int(invite_id))
+    except ValueError:
+        abort(400)
+
+
+def read_int(name, default=None):
+    """Read an integer from the query string, or abort with 400."""
+    value = request.args.get(name)
+    if value is None or value == '':
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        abort(400)
+
+
+@calendar.route('/invites')
+def invites():
+    """\
+    Lists invitations in order of their meeting dates, a page at a time.
+    They can be filtered by `owner` and `attendee` userid, `status`, and the
+    `start` and `end` of a range of meeting dates. Each page has the URL of
+    the `next` one, which picks up after the last invitation on this page.
+    """
+    limit = min(max(read_int('limit', PAGE_SIZE), 1), MAX_PAGE_SIZE)
+    status = read_int('status')
+    start = read_timestamp('start', required=False)
+    end = read_timestamp('end', required=False)
+    after = read_cursor()
+
+    with current_app.app_context():
+        query = db.session.query(
+            Invitation.id, Invitation.subject, Invitation.meeting_date,
+            Invitation.duration, Invitation.status, Invitation.recur,
+            Profile.userid,
+        ).outerjoin(Profile, Invitation.owner_id == Profile.id)
+
+        profile_ids = {}
+        for name in ('owner', 'attendee'):
+            userid = request.args.get(name)
+            if userid:
+                profile_ids[name] = find_profile_id(userid)
+                if profile_ids[name] is None:
+                    return json.jsonify(invitations=[], next=None)
+
+        if 'owner' in profile_ids:
+            query = query.filter(Invitation.owner_id == profile_ids['owner'])
+        if 'attendee' in profile_ids:
+            attendees = invitation_attendees.c
+            attending = db.session.query(attendees.invitation_id) \
+                .filter(attendees.profile_id == profile_ids['attendee'])
+            query = query.filter(Invitation.id.in_(attending))
+
+        if status is not None:
+            query = query.filter(Invitation.status == status)
+        if start is not None:
+            query = query.filter(Invitation.meeting_date >= start)
+        if end is not None:
+            query = query.filter(Invitation.meeting_date < end)
+        if after is not None:
+            (after_date, after_id) = after
+            query = query.filter(or_(
+                Invitation.meeting_date > after_date,
+                and_(Invitation.meeting_date == after_date,
+                     Invitation.id > after_id),
+            ))
+
+        with timed('list'):
+            rows = query.order_by(Invitation.meeting_date, Invitation.id) \
+                .limit(limit + 1).all()
+
+        next_url = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            args = request.args.to_dict()
+            args['after'] = '{},{}'.format(
+                last.meeting_date.strftime(CURSOR_FORMAT), last.id,
+            )
+            next_url = url_for('.invites', **args)
+
+        return json.jsonify(
+            invitations=[
+                {
+                    'id': row.id,
+                    'subject': row.subject,
+                    'meeting_date': row.meeting_date.isoformat(),
+                    'duration': row.duration,
+                    'status': row.status,
+                    'recur': (row.recur or RecurPeriod.none).name,
+                    'owner': row.userid,
+                    'url': url_for('.invite', invite_id=row.id),
+                }
+                for row in rows
+            ],
+            next=next_url,
+        )
+
+
+def page_validators(invite_id, version, updated_at, today):
+    """\
+    This returns the (ETag, Last-Modified) for an invitation's page. The page
+    has dates relative to `today` in it, so it changes at midnight too.
+    """
+    etag = '{}.{}.{}'.format(invite_id, version, today.isoformat())
+    midnight = datetime.datetime.utcfromtimestamp(
+        time.mktime(today.timetuple()),
+    )
+    return (etag, max(updated_at, midnight).replace(microsecond=0))
+
+
+def not_modified(etag, last_modified):
+    """\
+    Does the request already have this version of the page? If-None-Match
+    wins over If-Modified-Since when it's there.
+    """
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    since = request.if_modified_since
+    if since is not None:
+        return since.replace(tzinfo=None) >= last_modified
+    return False
+
+
+def page_response(page, etag, last_modified, status=200):
+    """Return the `page`, with the headers for validating it later."""
+    response = current_app.response_class(page, status=status)
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    # Caches can keep it, but have to check it's current each time.
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
 @calendar.route('/invites/<invite_id>')
 def invite(invite_id):
-    """The view page for the invite."""
+    """\
+    The view page for the invite. Pages are cached until the invitation's
+    version changes, and requests for a version the client already has get
+    a 304 after looking up only that.
+    """
     invite_id = int(invite_id)
     with current_app.app_context():
-        invitation = Invitation.query.get_or_404(invite_id)
-        return render_template(
-            'invite_show.html',
-            invitation=invitation,
-            timedelta=datetime.timedelta,
+        found = db.session.query(Invitation.version, Invitation.updated_at) \
+            .filter(Invitation.id == invite_id).first()
+        if found is None:
+            abort(404)
+        (version, updated_at) = found
+        today = datetime.date.today()
+        (etag, last_modified) = page_validators(
+            invite_id, version, updated_at, today,
         )
+        if not_modified(etag, last_modified):
+            return page_response(None, etag, last_modified, 304)
+
+        cached = PAGE_CACHE.get(invite_id)
+        if cached is not None and cached[:2] == (version, today):
+            return page_response(cached[2], etag, last_modified)
+
+        # Everything the template shows, in a few queries up front instead
+        # of one for each attendee and conflict while it renders.
+        invitation = Invitation.query.options(
+            joinedload(Invitation.owner),
+            subqueryload(Invitation.attendees),
+            subqueryload(Invitation.conflicts).joinedload(Conflict.profile),
+            subqueryload(Invitation.conflicts).joinedload(Conflict.other),
+            subqueryload(Invitation.conflicted_by)
+            .joinedload(Conflict.profile),
+            subqueryload(Invitation.conflicted_by)
+            .joinedload(Conflict.invitation),
+            subqueryload(Invitation.consults),
+        ).get(invite_id)
+        if invitation is None:
+            abort(404)
+
+        with timed('render'):
+            page = render_template(
+                'invite_show.html',
+                invitation=invitation,
+                timedelta=datetime.timedelta,
+            )
+        PAGE_CACHE.put(invite_id, (version, today, page))
+        return page_response(page, etag, last_modified)
+
+
+@calendar.route('/consults/<consult_id>')
+def consult(consult_id):
+    """The view page for a consult."""
+    with current_app.app_context():
+        found = Consult.query.options(
+            joinedload(Consult.invitation),
+            subqueryload(Consult.attendees),
+        ).get(int(consult_id))
+        if found is None:
+            abort(404)
+        return render_template('consult_show.html', consult=found)
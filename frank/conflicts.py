@@ -0,0 +1,203 @@
+"""\
+Finding the meetings that a new invitation clashes with.
+
+Each profile's meetings over the next `CONFLICT_DAYS` are kept in an
+`IntervalIndex`, cached between requests and checked against the profile's
+`schedule_version`, which goes up whenever its occurrences change.
+"""
+
+
+import datetime
+
+import numpy as np
+
+from frank.metrics import CacheMetrics, METRICS
+from frank.model import db, touch_invitations, Conflict, IN_CHUNK, Profile
+from frank.occurrences import occurrences_between
+from frank.recurrence import expand
+from frank.utils import chunks, LRUCache
+
+
+# How many days ahead of today meetings are checked for conflicts.
+CONFLICT_DAYS = 90
+
+# Each profile's (schedule_version, day, IntervalIndex).
+SCHEDULE_CACHE = LRUCache(1024)
+METRICS.append(CacheMetrics(
+    'frank_schedule_cache', 'Cache of schedules for conflict checks',
+    SCHEDULE_CACHE,
+))
+
+
+class IntervalIndex:
+    """\
+    The meetings of one profile, as intervals sorted by their starts, with
+    the running maximum of their ends. The meetings that could overlap an
+    interval are between two binary searches, one on each.
+
+    These are never changed after they're built, so they can be shared
+    between threads.
+    """
+
+    def __init__(self, intervals):
+        """`intervals` are (start, end, invitation ID) tuples."""
+        intervals = sorted(intervals)
+        self.intervals = intervals
+        self.starts = np.array([start for (start, _, _) in intervals],
+                               dtype='datetime64[s]')
+        self.ends = np.array([end for (_, end, _) in intervals],
+                             dtype='datetime64[s]')
+        self.ids = np.array([invite_id for (_, _, invite_id) in intervals],
+                            dtype='int64')
+        self.max_ends = np.maximum.accumulate(self.ends)
+
+    def overlapping(self, intervals):
+        """\
+        This returns the set of IDs of the invitations that overlap any of
+        the (start, end) `intervals`.
+        """
+        if not intervals or not len(self.starts):
+            return set()
+        starts = np.array([start for (start, _) in intervals],
+                          dtype='datetime64[s]')
+        ends = np.array([end for (_, end) in intervals],
+                        dtype='datetime64[s]')
+        # Everything from `his` on starts after the interval ends, and
+        # nothing before `los` ends after it starts.
+        his = np.searchsorted(self.starts, ends, 'left')
+        los = np.searchsorted(self.max_ends, starts, 'right')
+
+        found = set()
+        for (start, lo, hi) in zip(starts, los, his):
+            if lo < hi:
+                overlaps = self.ends[lo:hi] > start
+                found.update(self.ids[lo:hi][overlaps].tolist())
+        return found
+
+    def add(self, intervals):
+        """Return a new index with these (start, end, ID) `intervals` too."""
+        return IntervalIndex(self.intervals + list(intervals))
+
+    def __len__(self):
+        return len(self.intervals)
+
+
+def schedule_versions(profile_ids):
+    """This returns an index from profile ID to its `schedule_version`."""
+    index = {}
+    for chunk in chunks(sorted(set(profile_ids)), IN_CHUNK):
+        query = db.session.query(Profile.id, Profile.schedule_version) \
+            .filter(Profile.id.in_(chunk))
+        index.update(query)
+    return index
+
+
+class ConflictCheck:
+    """\
+    This checks the invitations in one ingest for conflicts. Create it before
+    inserting them, `check` each one after it has an ID, and call `committed`
+    after the transaction is committed, so the cache can be brought up to
+    date.
+    """
+
+    def __init__(self, today=None):
+        self.day = today or datetime.date.today()
+        self.start = datetime.datetime.combine(self.day, datetime.time())
+        self.end = self.start + datetime.timedelta(days=CONFLICT_DAYS)
+        self.versions = {}
+        self.indexes = {}
+        # The intervals added by this ingest, by profile ID.
+        self.added = {}
+
+    def load(self, profile_ids):
+        """\
+        This gets the indexes for `profile_ids`, from the cache where they're
+        current. Call it before the invitations are inserted.
+        """
+        needed = set(profile_ids).difference(self.indexes)
+        versions = schedule_versions(needed)
+        for profile_id in sorted(needed):
+            version = versions.get(profile_id, 0)
+            cached = SCHEDULE_CACHE.get(profile_id)
+            if cached is not None and cached[:2] == (version, self.day):
+                index = cached[2]
+            else:
+                index = IntervalIndex(
+                    (found.start, found.end, found.invitation_id)
+                    for found in occurrences_between(
+                        self.start, self.end, profile_id,
+                    )
+                )
+                SCHEDULE_CACHE.put(profile_id, (version, self.day, index))
+            self.versions[profile_id] = version
+            self.indexes[profile_id] = index
+
+    def intervals(self, meeting_time):
+        """\
+        This returns the (start, end) of each occurrence of a `MeetingTime`
+        that's inside the window being checked.
+        """
+        minutes = round(meeting_time.duration.total_seconds() / 60.0)
+        occurrences = expand(
+            [(0, meeting_time.start_time, minutes, meeting_time.recur,
+              meeting_time.recur_param)],
+            self.start, self.end,
+        )
+        return [(occurrence.start, occurrence.end)
+                for occurrence in occurrences]
+
+    def check(self, invitation_id, intervals, profile_ids):
+        """\
+        This returns a sorted list of (profile ID, other invitation ID) for
+        the meetings that the invitation's `intervals` overlap, for each of
+        `profile_ids`. It includes the invitations checked before it in this
+        ingest.
+        """
+        self.load(profile_ids)
+        found = set()
+        for profile_id in profile_ids:
+            others = self.indexes[profile_id].overlapping(intervals)
+            for (start, end, other_id) in self.added.get(profile_id, ()):
+                if any(s < end and start < e for (s, e) in intervals):
+                    others.add(other_id)
+            others.discard(invitation_id)
+            found.update((profile_id, other_id) for other_id in others)
+
+        for profile_id in profile_ids:
+            self.added.setdefault(profile_id, []).extend(
+                (start, end, invitation_id) for (start, end) in intervals
+            )
+        return sorted(found)
+
+    def committed(self):
+        """\
+        This adds the invitations from this ingest to the cached indexes of
+        the profiles that nobody else has changed since they were loaded,
+        and drops the rest from the cache.
+        """
+        versions = schedule_versions(self.added)
+        for (profile_id, added) in sorted(self.added.items()):
+            if versions.get(profile_id) == self.versions[profile_id] + 1:
+                SCHEDULE_CACHE.put(profile_id, (
+                    versions[profile_id], self.day,
+                    self.indexes[profile_id].add(added),
+                ))
+            else:
+                SCHEDULE_CACHE.pop(profile_id)
+
+
+def record_conflicts(invitation_id, conflicts):
+    """\
+    This saves the (profile ID, other invitation ID) pairs from
+    `ConflictCheck.check` for an invitation.
+    """
+    rows = [
+        {'invitation_id': invitation_id, 'other_id': other_id,
+         'profile_id': profile_id}
+        for (profile_id, other_id) in conflicts
+    ]
+    if rows:
+        db.session.execute(Conflict.__table__.insert(), rows)
+        # Their pages list the invitations that conflict with them.
+        touch_invitations(other_id for (_, other_id) in conflicts)
+    return len(rows)
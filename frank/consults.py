@@ -0,0 +1,213 @@
+"""\
+Making a `Consult` for each meeting that has happened.
+
+A single meeting that's done gets one consult, and a recurring one gets one
+for each occurrence that has started. Consults and their attendees are
+written with INSERT ... SELECT, so the invitations never have to be loaded.
+Nothing is made twice, so the job can be run again, or restarted after
+being stopped, safely, and on Postgres a consult or attendee that another
+process writes first is skipped rather than failing on the unique index.
+New invitations get their consults at ingest, the scheduler makes them for
+the occurrences of recurring meetings as they pass, and
+`python -m frank.manage make_consults` catches up on the rest.
+"""
+
+
+import datetime
+
+from sqlalchemy import and_, exists, func, or_, select, union
+
+from frank import recurrence
+from frank.model import (
+    consult_attendees, db, decode_recur_param, DONE, IN_CHUNK, insert_new,
+    insert_rows, invitation_attendees, roll_up, touch_invitations, Consult,
+    Invitation, RecurPeriod,
+)
+from frank.utils import chunks
+
+
+def _single_consults(ids):
+    """\
+    This makes the consults for the single meetings in `ids` that are done
+    and don't have one yet, and returns their invitation IDs.
+    """
+    invitation = Invitation.__table__
+    consult = Consult.__table__
+    needed = select([invitation.c.id]).where(and_(
+        invitation.c.id.in_(ids),
+        invitation.c.status == DONE,
+        or_(invitation.c.recur.is_(None),
+            invitation.c.recur == RecurPeriod.none),
+        ~exists().where(consult.c.from_invitation == invitation.c.id),
+    ))
+    made = [invite_id for (invite_id,) in db.session.execute(needed)]
+    if made:
+        db.session.execute(insert_new(consult).from_select(
+            ['from_invitation', 'meeting_date', 'duration'],
+            select([invitation.c.id, invitation.c.meeting_date,
+                    invitation.c.duration])
+            .where(invitation.c.id.in_(made)),
+        ))
+    return made
+
+
+def _recurring_consults(ids, cutoff):
+    """\
+    This makes the consults for the occurrences of the recurring meetings in
+    `ids` that started after their latest consult and before `cutoff`, and
+    returns the IDs of the invitations that got any.
+    """
+    query = db.session.query(
+        Invitation.id, Invitation.meeting_date, Invitation.duration,
+        Invitation.recur, Invitation.recur_param,
+        func.max(Consult.meeting_date),
+    ).outerjoin(Consult, Consult.from_invitation == Invitation.id) \
+        .filter(Invitation.id.in_(ids),
+                Invitation.status == DONE,
+                Invitation.recur.notin_([RecurPeriod.none])) \
+        .group_by(Invitation.id)
+
+    rows = []
+    for (invite_id, meeting_date, duration, recur, recur_param,
+         latest) in query:
+        # Occurrences are expanded to the second.
+        start = meeting_date if latest is None \
+            else latest + datetime.timedelta(seconds=1)
+        start = start.replace(microsecond=0)
+        found = recurrence.expand(
+            [(invite_id, meeting_date, duration, recur,
+              decode_recur_param(recur, recur_param))],
+            start, cutoff,
+        )
+        rows += [
+            {
+                'from_invitation': invite_id,
+                'meeting_date': occurrence.start,
+                'duration': duration,
+            }
+            for occurrence in found if occurrence.start >= start
+        ]
+    insert_rows(Consult.__table__, rows, new_only=True)
+    return sorted({row['from_invitation'] for row in rows})
+
+
+def copy_attendees(ids):
+    """\
+    This adds the owner and attendees of each of the invitations in `ids` to
+    all of its consults, where they aren't already, and rolls them up.
+    """
+    consult = Consult.__table__
+    invitation = Invitation.__table__
+    attending = invitation_attendees
+
+    def missing(profile_id):
+        return ~exists().where(and_(
+            consult_attendees.c.consult_id == consult.c.id,
+            consult_attendees.c.profile_id == profile_id,
+        ))
+
+    attendees = select([
+        consult.c.id.label('consult_id'), attending.c.profile_id,
+        consult.c.meeting_date, consult.c.duration,
+    ]).select_from(
+        consult.join(attending,
+                     attending.c.invitation_id == consult.c.from_invitation),
+    ).where(and_(
+        consult.c.from_invitation.in_(ids),
+        missing(attending.c.profile_id),
+    ))
+    owners = select([
+        consult.c.id, invitation.c.owner_id, consult.c.meeting_date,
+        consult.c.duration,
+    ]).select_from(
+        consult.join(invitation, invitation.c.id == consult.c.from_invitation),
+    ).where(and_(
+        consult.c.from_invitation.in_(ids),
+        invitation.c.owner_id.isnot(None),
+        missing(invitation.c.owner_id),
+    ))
+    pairs = union(attendees, owners).alias('pairs')
+    insert = insert_new(consult_attendees).from_select(
+        ['consult_id', 'profile_id'],
+        select([pairs.c.consult_id, pairs.c.profile_id]),
+    )
+
+    if db.engine.dialect.name == 'postgresql':
+        # Another process can add the same pairs after they're found here,
+        # so only the ones this INSERT wrote are added to the rollups.
+        added = insert.returning(
+            consult_attendees.c.consult_id, consult_attendees.c.profile_id,
+        ).cte('added')
+        attended = select([
+            added.c.profile_id, consult.c.meeting_date, consult.c.duration,
+        ]).select_from(added.join(consult, consult.c.id == added.c.consult_id))
+        roll_up(db.session.execute(attended))
+    else:
+        # Only the new pairs are read back, to add to the rollups, before
+        # they're written.
+        roll_up(
+            (profile_id, meeting_date, duration)
+            for (_, profile_id, meeting_date, duration)
+            in db.session.execute(pairs.select())
+        )
+        db.session.execute(insert)
+
+
+def make_consults(ids, cutoff=None):
+    """\
+    This makes the consults that the invitations with `ids` are missing, up
+    to `cutoff`, in the current transaction. It returns the IDs of the
+    invitations that got any.
+    """
+    cutoff = cutoff or datetime.datetime.now()
+    made = []
+    for chunk in chunks(sorted(set(ids)), IN_CHUNK):
+        changed = _single_consults(chunk) + _recurring_consults(chunk, cutoff)
+        if changed:
+            copy_attendees(changed)
+            made += changed
+    # Their pages link to the consults.
+    touch_invitations(made)
+    return made
+
+
+def done_batches(size, after=0, recurring=False):
+    """\
+    This yields the IDs of the invitations that are done, `size` at a time,
+    starting after the ID `after`. With `recurring`, only the recurring ones
+    are included.
+    """
+    while True:
+        query = db.session.query(Invitation.id) \
+            .filter(Invitation.id > after, Invitation.status == DONE)
+        if recurring:
+            query = query.filter(
+                Invitation.recur.notin_([RecurPeriod.none]),
+            )
+        ids = [
+            invite_id for (invite_id,)
+            in query.order_by(Invitation.id).limit(size)
+        ]
+        if not ids:
+            break
+        yield ids
+        after = ids[-1]
+
+
+def catch_up(batch=1000, after=0, progress=None, recurring=False):
+    """\
+    This makes the missing consults for all the invitations that are done,
+    or just the recurring ones if `recurring` is given, committing after
+    each `batch` of them. `progress` is called with the last invitation ID in
+    the batch and the number of invitations so far that got consults, and a
+    stopped run can be picked up `after` that ID. It returns the number of
+    invitations that got consults.
+    """
+    cutoff = datetime.datetime.now()
+    count = 0
+    for ids in done_batches(batch, after, recurring):
+        count += len(make_consults(ids, cutoff))
+        db.session.commit()
+        if progress is not None:
+            progress(ids[-1], count)
+    return count
@@ -0,0 +1,182 @@
+"""\
+Aggregating error reports.
+
+An error is identified by a fingerprint of its route and its stacktrace, with
+the line numbers and the exception's message left out, so the same failure
+on different input is counted as one `ErrorReport` with a `count` and when it
+was first and last seen. Reports are collected in memory and written by a
+thread in the background, a batch every few seconds, instead of in the
+request that failed. Whatever's left when the process exits is flushed
+then.
+"""
+
+
+import atexit
+import datetime
+import hashlib
+import os
+import re
+import threading
+import traceback
+
+from flask import current_app, has_app_context
+from sqlalchemy import text
+
+from frank.model import db
+
+
+ERROR_ADD = text(
+    'INSERT INTO error_report '
+    '(fingerprint, message, stacktrace, route, count, first_seen, '
+    'last_seen) '
+    'VALUES (:fingerprint, :message, :stacktrace, :route, :count, '
+    ':first_seen, :last_seen) '
+    'ON CONFLICT (fingerprint) DO UPDATE SET '
+    'count = error_report.count + excluded.count, '
+    'last_seen = excluded.last_seen'
+)
+
+ROUTE_LENGTH = 75
+
+FRAME = re.compile(r'\s*File "(?P<path>[^"]+)", line \d+, in (?P<name>.+)')
+EXCEPTION = re.compile(r'(?P<type>[A-Za-z_][\w.]*)(?::|$)')
+
+
+def normalize(stacktrace):
+    """\
+    This returns the parts of a formatted traceback that don't change from
+    one failure to the next: the file and function of each frame, and the
+    type of each exception.
+    """
+    parts = []
+    for line in stacktrace.splitlines():
+        frame = FRAME.match(line)
+        if frame is not None:
+            parts.append('{} {}'.format(
+                os.path.basename(frame.group('path')), frame.group('name'),
+            ))
+        elif line and not line[0].isspace():
+            # This skips the "Traceback (most recent call last):" lines too.
+            exception = EXCEPTION.match(line)
+            if exception is not None:
+                parts.append(exception.group('type'))
+    return '\n'.join(parts)
+
+
+def fingerprint(route, stacktrace, message=None):
+    """\
+    This returns the fingerprint of an error from `route`. Errors without a
+    stacktrace are told apart by their `message` instead.
+    """
+    key = normalize(stacktrace) if stacktrace else (message or '')
+    return hashlib.sha256(
+        '{}\n{}'.format(route, key).encode('utf8'),
+    ).hexdigest()
+
+
+class ErrorBuffer:
+    """\
+    This collects error reports, merging repeats, until they're flushed to
+    the `error_report` table. The first time it's given a report in an app
+    context, it starts a thread that flushes every `interval` seconds, or as
+    soon as `size` different errors are waiting.
+    """
+
+    def __init__(self, interval=5.0, size=100):
+        self.interval = interval
+        self.size = size
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.wake = threading.Event()
+        self.app = None
+        self.pid = None
+
+    def report(self, message, route, stacktrace=None):
+        """Add an error to the buffer, or to the one like it already there."""
+        route = (route or '')[:ROUTE_LENGTH]
+        key = fingerprint(route, stacktrace, message)
+        now = datetime.datetime.utcnow()
+        with self.lock:
+            entry = self.pending.get(key)
+            if entry is None:
+                self.pending[key] = {
+                    'fingerprint': key,
+                    'message': message,
+                    'stacktrace': stacktrace,
+                    'route': route,
+                    'count': 1,
+                    'first_seen': now,
+                    'last_seen': now,
+                }
+            else:
+                entry['count'] += 1
+                entry['last_seen'] = now
+            waiting = len(self.pending)
+        if waiting >= self.size:
+            self.wake.set()
+        self._start()
+
+    def _start(self):
+        """Start the flushing thread in this process, if it's not running."""
+        if self.pid == os.getpid() or not has_app_context():
+            return
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.app = current_app._get_current_object()
+            self.interval = self.app.config.get(
+                'FRANK_ERROR_FLUSH', self.interval,
+            )
+            self.size = self.app.config.get('FRANK_ERROR_BUFFER', self.size)
+        thread = threading.Thread(target=self._run, name='error-flush')
+        thread.daemon = True
+        thread.start()
+        atexit.register(self._flush_app)
+
+    def _run(self):
+        while True:
+            self.wake.wait(self.interval)
+            self.wake.clear()
+            self._flush_app()
+
+    def _flush_app(self):
+        """Flush in an app context of its own, printing any failure."""
+        with self.app.app_context():
+            try:
+                self.flush()
+            except Exception:
+                traceback.print_exc()
+            finally:
+                db.session.remove()
+
+    def flush(self):
+        """\
+        This writes the waiting reports, adding them to the rows for the same
+        errors, and returns how many different errors were written. If that
+        fails, they're put back to try again.
+        """
+        with self.lock:
+            (pending, self.pending) = (self.pending, {})
+        if not pending:
+            return 0
+        try:
+            # In order, for the same reason as in `resolve_profiles`.
+            db.session.execute(ERROR_ADD, [
+                pending[key] for key in sorted(pending)
+            ])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            with self.lock:
+                for (key, entry) in pending.items():
+                    newer = self.pending.get(key)
+                    if newer is not None:
+                        entry['count'] += newer['count']
+                        entry['last_seen'] = newer['last_seen']
+                    self.pending[key] = entry
+            raise
+        return len(pending)
+
+
+ERRORS = ErrorBuffer()
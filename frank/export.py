@@ -0,0 +1,164 @@
+"""\
+Streaming the invitations or consults out as NDJSON or CSV.
+
+The rows are read a batch at a time, in order of their IDs, and each batch's
+attendees are looked up in one query. Only one batch is in memory at once,
+however many rows there are. `python -m frank.manage export` writes to a
+file, and /calendar/export streams the same thing as a chunked response.
+"""
+
+
+import csv
+import io
+import json
+
+from frank.model import (
+    consult_attendees, db, decode_recur_param, invitation_attendees,
+    Consult, Invitation, Profile, RecurPeriod,
+)
+
+
+KINDS = ('invitations', 'consults')
+FORMATS = ('ndjson', 'csv')
+
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+FIELDS = {
+    'invitations': [
+        'id', 'subject', 'meeting_date', 'duration', 'status', 'recur',
+        'recur_param', 'owner', 'attendees',
+    ],
+    'consults': [
+        'id', 'invitation_id', 'meeting_date', 'duration', 'attendees',
+    ],
+}
+
+
+def attendee_index(table, key, ids):
+    """\
+    This returns an index from ID to the sorted userids of its attendees in
+    the association `table`, for the `ids` in one batch.
+    """
+    index = {}
+    query = db.session.query(table.c[key], Profile.userid) \
+        .join(Profile, Profile.id == table.c.profile_id) \
+        .filter(table.c[key].in_(ids)) \
+        .order_by(table.c[key], Profile.userid)
+    for (row_id, userid) in query:
+        index.setdefault(row_id, []).append(userid)
+    return index
+
+
+def invitation_batches(batch):
+    """This yields the invitation records, a list of `batch` at a time."""
+    last_id = 0
+    while True:
+        rows = db.session.query(
+            Invitation.id, Invitation.subject, Invitation.meeting_date,
+            Invitation.duration, Invitation.status, Invitation.recur,
+            Invitation.recur_param, Profile.userid,
+        ).outerjoin(Profile, Profile.id == Invitation.owner_id) \
+            .filter(Invitation.id > last_id) \
+            .order_by(Invitation.id) \
+            .limit(batch) \
+            .all()
+        if not rows:
+            break
+        attendees = attendee_index(
+            invitation_attendees, 'invitation_id', [row.id for row in rows],
+        )
+        records = []
+        for row in rows:
+            recur = row.recur or RecurPeriod.none
+            recur_param = decode_recur_param(recur, row.recur_param)
+            records.append({
+                'id': row.id,
+                'subject': row.subject,
+                'meeting_date': row.meeting_date.isoformat(),
+                'duration': row.duration,
+                'status': row.status,
+                'recur': recur.name,
+                'recur_param': recur_param,
+                'owner': row.userid,
+                'attendees': attendees.get(row.id, []),
+            })
+        yield records
+        last_id = rows[-1].id
+
+
+def consult_batches(batch):
+    """This yields the consult records, a list of `batch` at a time."""
+    last_id = 0
+    while True:
+        rows = db.session.query(
+            Consult.id, Consult.from_invitation, Consult.meeting_date,
+            Consult.duration,
+        ).filter(Consult.id > last_id) \
+            .order_by(Consult.id) \
+            .limit(batch) \
+            .all()
+        if not rows:
+            break
+        attendees = attendee_index(
+            consult_attendees, 'consult_id', [row.id for row in rows],
+        )
+        yield [
+            {
+                'id': row.id,
+                'invitation_id': row.from_invitation,
+                'meeting_date': row.meeting_date.isoformat(),
+                'duration': row.duration,
+                'attendees': attendees.get(row.id, []),
+            }
+            for row in rows
+        ]
+        last_id = rows[-1].id
+
+
+BATCHES = {
+    'invitations': invitation_batches,
+    'consults': consult_batches,
+}
+
+
+def _csv_value(value):
+    """Lists go in a CSV cell separated by spaces, and tuples by slashes."""
+    if isinstance(value, list):
+        return ' '.join(value)
+    elif isinstance(value, tuple):
+        return '/'.join(str(part) for part in value)
+    return value
+
+
+def export(kind, format='ndjson', batch=1000):
+    """\
+    This yields the `kind` of records, 'invitations' or 'consults', as text
+    in `format`, 'ndjson' or 'csv', one chunk for each `batch` of rows.
+    """
+    if kind not in KINDS or format not in FORMATS:
+        raise ValueError('unknown export: {} as {}'.format(kind, format))
+    fields = FIELDS[kind]
+
+    if format == 'csv':
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(fields)
+        yield buf.getvalue()
+
+    for records in BATCHES[kind](batch):
+        if format == 'ndjson':
+            yield ''.join(
+                json.dumps(record, sort_keys=True) + '\n'
+                for record in records
+            )
+        else:
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            writer.writerows(
+                [_csv_value(record[field]) for field in fields]
+                for record in records
+            )
+            yield buf.getvalue()
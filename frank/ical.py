@@ -0,0 +1,136 @@
+"""\
+Reading meeting times and attendees straight from an invitation's
+text/calendar part.
+
+`parse` returns the same (start, end, recur, recur_param) tuple that
+`frank.when.parse` does, so `MeetingTime.from_parsed` can use either.
+"""
+
+
+import datetime
+
+import icalendar
+
+
+WEEKDAYS = {code: i for i, code in enumerate('MO TU WE TH FR SA SU'.split())}
+
+
+def is_calendar(attachment):
+    """Is this attachment's metadata for a text/calendar part?"""
+    content_type = (attachment.get('content_type') or '').lower()
+    filename = (attachment.get('filename') or '').lower()
+    return (content_type.startswith('text/calendar') or
+            filename.endswith('.ics'))
+
+
+def _datetime(value):
+    """Turn a DTSTART/DTEND value, which could be a date, into a datetime."""
+    if isinstance(value, datetime.datetime):
+        return value
+    return datetime.datetime.combine(value, datetime.time())
+
+
+def _userid(address):
+    """Return the userid from a mailto: calendar address."""
+    address = str(address)
+    if address.lower().startswith('mailto:'):
+        address = address[7:]
+    return address.split('@')[0]
+
+
+def _single(rule, key):
+    """Return the only value of `key` in the RRULE, or None if it's unset."""
+    values = rule.get(key)
+    if values is None:
+        return None
+    if not isinstance(values, list):
+        values = [values]
+    if len(values) != 1:
+        raise ValueError('RRULE has more than one {}'.format(key))
+    return values[0]
+
+
+def _local(value):
+    """\
+    Convert a DTSTART/DTEND to naive local time, which is what the times of
+    meetings from When lines are stored in. Floating times are left as they
+    are.
+    """
+    if value.tzinfo is None:
+        return value
+    return value.astimezone().replace(tzinfo=None)
+
+
+def _recurrence(rule, start, shift=0):
+    """\
+    Return the (recur, recur_param) for the RRULE. `start` is the local
+    start, and `shift` is how many days it is from the date the rule's
+    BYDAY and BYMONTHDAY were written for. This raises ValueError for rules
+    that `RecurPeriod` can't represent.
+    """
+    if rule is None:
+        return ('none', None)
+    for key in ('INTERVAL', 'BYSETPOS', 'BYWEEKNO', 'BYYEARDAY'):
+        if key in rule and rule[key] not in ([1], 1):
+            raise ValueError('unsupported RRULE: {}'.format(rule.to_ical()))
+
+    freq = _single(rule, 'FREQ')
+    if freq == 'DAILY':
+        return ('daily', None)
+    elif freq == 'WEEKLY':
+        day = _single(rule, 'BYDAY')
+        if day is None:
+            return ('weekly', start.weekday())
+        return ('weekly', (WEEKDAYS[day] + shift) % 7)
+    elif freq == 'MONTHLY' and 'BYDAY' not in rule:
+        month_day = _single(rule, 'BYMONTHDAY')
+        if month_day is None:
+            return ('monthly', start.day)
+        month_day = int(month_day) + shift
+        if not 1 <= month_day <= 31:
+            raise ValueError('unsupported RRULE: {}'.format(rule.to_ical()))
+        return ('monthly', month_day)
+    elif freq == 'YEARLY':
+        return ('annually', (start.month, start.day))
+    raise ValueError('unsupported RRULE: {}'.format(rule.to_ical()))
+
+
+def parse(data):
+    """\
+    Parse the first VEVENT in the calendar `data` into a tuple of
+    ((start, end, recur, recur_param), attendee userids). The organizer is
+    listed first. This raises ValueError if there's no VEVENT or it can't be
+    represented.
+    """
+    calendar = icalendar.Calendar.from_ical(data)
+    events = calendar.walk('VEVENT')
+    if not events:
+        raise ValueError('no VEVENT in calendar')
+    event = events[0]
+
+    start = _datetime(event.decoded('DTSTART'))
+    if 'DTEND' in event:
+        end = _datetime(event.decoded('DTEND'))
+    elif 'DURATION' in event:
+        end = start + event.decoded('DURATION')
+    else:
+        end = start
+
+    # Meetings from When lines are stored in local time, so these are
+    # converted to it, and the days in an RRULE are moved along if that lands
+    # on another date.
+    local = _local(start)
+    shift = (local.date() - start.date()).days
+    (start, end) = (local, _local(end))
+    (recur, recur_param) = _recurrence(event.get('RRULE'), start, shift)
+
+    addresses = []
+    if 'ORGANIZER' in event:
+        addresses.append(event['ORGANIZER'])
+    attendees = event.get('ATTENDEE', [])
+    if not isinstance(attendees, list):
+        attendees = [attendees]
+    addresses += attendees
+
+    return ((start, end, recur, recur_param),
+            [_userid(address) for address in addresses])
@@ -0,0 +1,276 @@
+"""\
+Generating invitations and replaying them against the app, to see how it
+holds up under load.
+
+The payloads cover a one-off meeting and every recurrence that
+`MeetingTime.parse` reads, with a spread of attendee counts and body sizes.
+Each is posted to the webhook, and then its invitation's page is fetched,
+from `concurrency` threads at once. This goes through the test client in
+this process, or over HTTP to a running server. Run it with `python -m
+frank.manage load_test`. In this process, it writes to a throwaway SQLite
+database, so its invitations aren't left behind in a real one.
+"""
+
+
+import collections
+import concurrent.futures
+import contextlib
+import datetime
+import json
+import math
+import os
+import random
+import string
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from frank.model import db
+
+
+ATTENDEE_COUNTS = [0, 1, 2, 5, 10, 40]
+BODY_SIZES = [0, 256, 4 << 10, 64 << 10]
+
+TIMEZONE = '(UTC-05:00) Eastern Time (US & Canada)'
+
+
+def _clock(when):
+    return when.strftime('%I:%M %p').lstrip('0')
+
+
+def _effective(when):
+    return '{}/{}/{}.'.format(when.month, when.day, when.year)
+
+
+def when_line(shape, start, minutes):
+    """\
+    This returns a When line for a meeting of `minutes` starting at `start`,
+    that recurs as `shape`: 'once', 'daily', 'weekly', 'monthly', or
+    'annually'.
+    """
+    end = start + datetime.timedelta(minutes=minutes)
+    times = 'from {} to {} effective {} {}'.format(
+        _clock(start), _clock(end), _effective(start), TIMEZONE,
+    )
+    if shape == 'once':
+        return '{} {}-{}. {}'.format(
+            start.strftime('%A, %B %d, %Y'), start.strftime('%I:%M %p'),
+            end.strftime('%I:%M %p'), TIMEZONE,
+        )
+    elif shape == 'daily':
+        return 'Occurs every day ' + times
+    elif shape == 'weekly':
+        return 'Occurs every {} {}'.format(start.strftime('%A'), times)
+    elif shape == 'monthly':
+        return 'Occurs every month on day {} of the month {}'.format(
+            start.day, times,
+        )
+    elif shape == 'annually':
+        return 'Occurs every {} {} {}'.format(
+            start.strftime('%B'), start.day, times,
+        )
+    raise ValueError('unknown shape: {!r}'.format(shape))
+
+
+SHAPES = ['once', 'daily', 'weekly', 'monthly', 'annually']
+
+
+def _userid(rng):
+    return (''.join(rng.choice(string.ascii_lowercase) for _ in range(3)) +
+            str(rng.randint(0, 9)) +
+            rng.choice(string.ascii_lowercase))
+
+
+def _filler(rng, size):
+    """Return about `size` characters of lowercase words."""
+    words = []
+    length = 0
+    while length < size:
+        word = ''.join(rng.choice(string.ascii_lowercase)
+                       for _ in range(rng.randint(2, 10)))
+        words.append(word)
+        length += len(word) + 1
+    return ' '.join(words)
+
+
+def make_payloads(count, seed=0):
+    """\
+    This returns `count` webhook form payloads, cycling through the shapes
+    and picking attendee counts and body sizes at random. Each has its own
+    Message-ID, so none of them are duplicates, even across runs.
+    """
+    rng = random.Random(seed)
+    run = '{:x}'.format(int(time.time() * 1000))
+    now = datetime.datetime.now().replace(second=0, microsecond=0)
+    payloads = []
+    for i in range(count):
+        shape = SHAPES[i % len(SHAPES)]
+        start = now + datetime.timedelta(days=rng.randint(-60, 60),
+                                         minutes=rng.randint(0, 8) * 30)
+        attendees = [_userid(rng)
+                     for _ in range(rng.choice(ATTENDEE_COUNTS))]
+        body = 'When: {}\nWhere: Somewhere\n\n*~*~*~*~*~*~*~*~*~*\n\n{}\n' \
+            .format(when_line(shape, start, rng.choice([15, 30, 60, 90])),
+                    _filler(rng, rng.choice(BODY_SIZES)))
+        payloads.append({
+            'envelope[from]': '{}@virginia.edu'.format(_userid(rng)),
+            'headers[To]': ', '.join(
+                ['frankbot@cloudmailin.com'] +
+                ['{}@virginia.edu'.format(userid) for userid in attendees]
+            ),
+            'headers[Subject]': 'Load test {} {}'.format(shape, i),
+            'headers[Message-ID]': '<load-{}-{}@frank>'.format(run, i),
+            'plain': body,
+            'reply_plain': '',
+        })
+    return payloads
+
+
+class InProcess:
+    """Sends requests to the app through a test client for each thread."""
+
+    def __init__(self, app):
+        self.app = app
+        self.local = threading.local()
+
+    def _client(self):
+        if not hasattr(self.local, 'client'):
+            self.local.client = self.app.test_client()
+        return self.local.client
+
+    def post(self, path, data):
+        response = self._client().post(path, data=data)
+        return (response.status_code, response.data)
+
+    def get(self, path):
+        response = self._client().get(path)
+        return (response.status_code, response.data)
+
+
+@contextlib.contextmanager
+def scratch_database(app):
+    """\
+    This points `app` at a new SQLite database, with the tables created, and
+    without the spool, until the block is done. Then the database is thrown
+    away and the old settings are put back.
+    """
+    saved = {key: app.config.get(key)
+             for key in ('SQLALCHEMY_DATABASE_URI', 'FRANK_SPOOL')}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(
+            temp_dir, 'load_test.db',
+        )
+        app.config['FRANK_SPOOL'] = None
+        try:
+            with app.app_context():
+                db.create_all()
+            yield
+        finally:
+            with app.app_context():
+                db.session.remove()
+                db.engine.dispose()
+            app.config.update(saved)
+
+
+class OverHTTP:
+    """Sends requests to the server at a base URL."""
+
+    def __init__(self, url, timeout=60.0):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+
+    def _open(self, request):
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as r:
+                return (r.status, r.read())
+        except urllib.error.HTTPError as exc:
+            return (exc.code, exc.read())
+        except (urllib.error.URLError, OSError):
+            return (None, b'')
+
+    def post(self, path, data):
+        body = urllib.parse.urlencode(data).encode('utf8')
+        return self._open(urllib.request.Request(self.url + path, body))
+
+    def get(self, path):
+        return self._open(urllib.request.Request(self.url + path))
+
+
+def percentile(ordered, fraction):
+    """Return the nearest-rank `fraction` percentile of a sorted list."""
+    if not ordered:
+        return 0.0
+    rank = max(math.ceil(fraction * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+class Timings:
+    """The latencies and failures of each operation, safe across threads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.seconds = collections.defaultdict(list)
+        self.errors = collections.Counter()
+
+    def record(self, operation, seconds, ok):
+        with self.lock:
+            if ok:
+                self.seconds[operation].append(seconds)
+            else:
+                self.errors[operation] += 1
+
+    def report(self, wall):
+        """Return the lines of a summary, given the run's `wall` seconds."""
+        lines = ['{:<8} {:>6} {:>6} {:>9} {:>9} {:>9} {:>9}'.format(
+            'op', 'ok', 'errors', 'req/s', 'p50', 'p95', 'p99',
+        )]
+        for operation in ('ingest', 'page'):
+            ordered = sorted(self.seconds[operation])
+            lines.append(
+                '{:<8} {:>6} {:>6} {:>9.1f} {:>7.1f}ms {:>7.1f}ms '
+                '{:>7.1f}ms'.format(
+                    operation, len(ordered), self.errors[operation],
+                    len(ordered) / wall if wall else 0.0,
+                    percentile(ordered, 0.50) * 1e3,
+                    percentile(ordered, 0.95) * 1e3,
+                    percentile(ordered, 0.99) * 1e3,
+                )
+            )
+        return lines
+
+
+def replay(target, payload, timings):
+    """\
+    Post one payload, then fetch its invitation's page, unless it was
+    spooled.
+    """
+    start = time.perf_counter()
+    (status, data) = target.post('/calendar/invites/incoming', payload)
+    timings.record('ingest', time.perf_counter() - start,
+                   status in (200, 202))
+    # A spooled message (202) doesn't have its invitation yet.
+    if status != 200:
+        return
+    invite_id = json.loads(data.decode('utf8'))['id']
+
+    start = time.perf_counter()
+    (status, _) = target.get('/calendar/invites/{}'.format(invite_id))
+    timings.record('page', time.perf_counter() - start, status == 200)
+
+
+def run(target, payloads, concurrency=4):
+    """\
+    This replays `payloads` against `target` from `concurrency` threads, and
+    returns the `Timings` and the wall-clock seconds it took.
+    """
+    timings = Timings()
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(concurrency) as pool:
+        futures = [pool.submit(replay, target, payload, timings)
+                   for payload in payloads]
+        for future in concurrent.futures.as_completed(futures):
+            future.result()
+    return (timings, time.perf_counter() - start)
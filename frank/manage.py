@@ -2,14 +2,29 @@
 """The manager app."""
 
 
+import datetime
 import os
 import subprocess
+import sys
 import tempfile
+import time
 
 from flask.ext.script import Manager
 from flask_migrate import MigrateCommand
 
+from frank import loadtest
 from frank.app import create_app
+from frank.archive import import_archive
+from frank.calendar.ingest import ingest_spooled
+from frank.consults import catch_up
+from frank.export import export as export_records
+from frank.occurrences import (
+    default_window, extend_horizon, rebuild as rebuild_occurrences,
+    HISTORY_DAYS, HORIZON_DAYS,
+)
+from frank.rollups import rebuild as rebuild_consult_rollups
+from frank.scheduler import complete_due
+from frank.spool import Spool
 
 
 HEROKU_APP = 'frankensystem'
@@ -133,6 +148,191 @@ def post_fixture(url=None, data_file=None):
         os.remove(temp_file)
 
 
+@manager.command
+def drain_spool(batch=100, interval=1.0, once=False):
+    """\
+    Ingest the invitations waiting in the spool (FRANK_SPOOL) in batches. This
+    runs until it's killed, or until the spool is empty if `once` is given.
+    """
+    path = app.config.get('FRANK_SPOOL')
+    if not path:
+        raise SystemExit('FRANK_SPOOL is not set.')
+    spool = Spool(path)
+    batch = int(batch)
+    interval = float(interval)
+    route = 'spool {}'.format(path)
+    store_root = app.config['FRANK_ATTACHMENTS']
+
+    with app.app_context():
+        while True:
+            drained = ingest_spooled(spool, batch, route, store_root)
+            if drained is None:
+                if once:
+                    break
+                time.sleep(interval)
+                continue
+
+            (results, retry) = drained
+            errors = sum(1 for result in results if 'error' in result)
+            print('ingested {} from the spool, {} error(s), {} to retry, '
+                  '{} waiting'.format(
+                      len(results) - errors, errors, retry, len(spool),
+                  ))
+
+
+@manager.command
+def schedule_statuses(batch=1000, interval=60.0, once=False):
+    """\
+    Mark pending invitations as done once their meetings have started, and
+    make the consults for recurring meetings whose next occurrences have,
+    every `interval` seconds. This runs until it's killed, or just once if
+    `once` is given. More than one of these can run at a time.
+    """
+    batch = int(batch)
+    interval = float(interval)
+
+    with app.app_context():
+        while True:
+            count = complete_due(batch)
+            if count:
+                print('marked {} invitation(s) as done'.format(count))
+            count = catch_up(batch, recurring=True)
+            if count:
+                print('made consults for {} recurring invitation(s)'.format(
+                    count,
+                ))
+            if once:
+                break
+            time.sleep(interval)
+
+
+@manager.command
+def make_consults(batch=1000, after=0):
+    """\
+    Make the missing consults for the invitations that are done, `batch` at a
+    time. A run that was stopped can be picked up `after` the last ID it
+    printed.
+    """
+    def progress(last_id, count):
+        print('through invitation {}, {} got consults'.format(last_id, count))
+
+    with app.app_context():
+        count = catch_up(int(batch), int(after), progress)
+    print('made consults for {} invitation(s)'.format(count))
+
+
+@manager.command
+def rebuild_rollups(batch=100):
+    """Recompute the consult rollups, `batch` profiles at a time."""
+    def progress(done):
+        print('rolled up {} profile(s)'.format(done))
+
+    with app.app_context():
+        count = rebuild_consult_rollups(int(batch), progress)
+    print('rolled up {} consult attendee(s)'.format(count))
+
+
+@manager.command
+def export(kind='invitations', format='ndjson', output=None, batch=1000):
+    """\
+    Write all the invitations or consults (`kind`) to `output`, or to stdout,
+    as NDJSON or CSV (`format`), a batch at a time.
+    """
+    fout = sys.stdout if output is None \
+        else open(output, 'w', encoding='utf8', newline='')
+    try:
+        with app.app_context():
+            for chunk in export_records(kind, format, int(batch)):
+                fout.write(chunk)
+    finally:
+        if output is not None:
+            fout.close()
+
+
+@manager.command
+def import_mail(path, batch=1000, processes=None, checkpoint=None):
+    """\
+    Import the invitations in an mbox file or Maildir directory, parsing
+    them in `processes` workers and committing `batch` at a time. If it's
+    stopped, running it again picks up from the `checkpoint` file, which is
+    next to the archive by default.
+    """
+    processes = None if processes is None else int(processes)
+
+    with app.app_context():
+        stats = import_archive(
+            path, app.config['FRANK_ATTACHMENTS'],
+            app.config['FRANK_ATTACHMENT_MAX_BYTES'], int(batch), processes,
+            checkpoint, print,
+        )
+    print('imported {}'.format(stats))
+
+
+@manager.command
+def load_test(url=None, count=500, threads=4, seed=0, real_database=False):
+    """\
+    Post `count` generated invitations, and fetch each one's page, from
+    `threads` threads, and report the throughput and latencies. This goes
+    to the server at `url`, or through the app in this process. That writes
+    to a throwaway SQLite database, unless `real_database` is given to write
+    to the configured one.
+    """
+    payloads = loadtest.make_payloads(int(count), int(seed))
+    if url is not None:
+        (timings, wall) = loadtest.run(
+            loadtest.OverHTTP(url), payloads, int(threads),
+        )
+    elif real_database:
+        (timings, wall) = loadtest.run(
+            loadtest.InProcess(app), payloads, int(threads),
+        )
+    else:
+        with loadtest.scratch_database(app):
+            (timings, wall) = loadtest.run(
+                loadtest.InProcess(app), payloads, int(threads),
+            )
+    for line in timings.report(wall):
+        print(line)
+
+
+occurrences = Manager(usage='Maintain the materialized occurrence table.')
+
+
+def _print_rows(count):
+    print('{} occurrence row(s)'.format(count))
+
+
+@occurrences.command
+def extend(days=HORIZON_DAYS, history=HISTORY_DAYS, batch=1000):
+    """\
+    Fill the occurrence table out to `days` from today, and drop the rows
+    from more than `history` days before today.
+    """
+    (start, end) = default_window(int(days), int(history))
+    with app.app_context():
+        count = extend_horizon(start, end, int(batch), _print_rows)
+    print('moved the horizon to run from {} to {}, adding {} row(s)'.format(
+        start, end, count,
+    ))
+
+
+@occurrences.command
+def rebuild(since=None, days=HORIZON_DAYS, batch=1000):
+    """\
+    Empty the occurrence table and fill it again, from `since` (YYYY-MM-DD)
+    out to `days` from today.
+    """
+    (start, end) = default_window(int(days))
+    if since is not None:
+        start = datetime.datetime.strptime(since, '%Y-%m-%d')
+    with app.app_context():
+        count = rebuild_occurrences(start, end, int(batch), _print_rows)
+    print('rebuilt {} to {}, with {} row(s)'.format(start, end, count))
+
+
+manager.add_command('occurrences', occurrences)
+
+
 manager.add_command('db', MigrateCommand)
 
 
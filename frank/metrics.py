@@ -0,0 +1,168 @@
+"""\
+Latency histograms and counters for the ingest pipeline, rendered in the
+Prometheus text format.
+
+These are kept in memory for each process, so every gunicorn worker reports
+its own numbers.
+"""
+
+
+import bisect
+import contextlib
+import threading
+import time
+
+
+# Upper bounds, in seconds, for the latency buckets.
+BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+    2.5, 5.0, 10.0,
+)
+
+
+class Histogram:
+    """A histogram of observations, with one series per label value."""
+
+    def __init__(self, name, help_text, label, buckets=BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = buckets
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, label_value, value):
+        """Record one observation for the series `label_value`."""
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(label_value)
+            if series is None:
+                series = self.series[label_value] = {
+                    'counts': [0] * (len(self.buckets) + 1),
+                    'sum': 0.0,
+                }
+            series['counts'][i] += 1
+            series['sum'] += value
+
+    def render(self):
+        """Return the lines for this histogram in the text format."""
+        lines = [
+            '# HELP {} {}'.format(self.name, self.help_text),
+            '# TYPE {} histogram'.format(self.name),
+        ]
+        with self.lock:
+            series = sorted(
+                (key, list(value['counts']), value['sum'])
+                for key, value in self.series.items()
+            )
+
+        for label_value, counts, total in series:
+            cumulative = 0
+            bounds = [repr(bound) for bound in self.buckets] + ['+Inf']
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                lines.append('{}_bucket{{{}="{}",le="{}"}} {}'.format(
+                    self.name, self.label, label_value, bound, cumulative,
+                ))
+            lines.append('{}_sum{{{}="{}"}} {!r}'.format(
+                self.name, self.label, label_value, total,
+            ))
+            lines.append('{}_count{{{}="{}"}} {}'.format(
+                self.name, self.label, label_value, cumulative,
+            ))
+
+        return lines
+
+
+class Counter:
+    """A counter, with one series per label value."""
+
+    def __init__(self, name, help_text, label):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def inc(self, label_value, amount=1):
+        """Add `amount` to the series `label_value`."""
+        with self.lock:
+            self.series[label_value] = self.series.get(label_value, 0) + amount
+
+    def render(self):
+        """Return the lines for this counter in the text format."""
+        lines = [
+            '# HELP {} {}'.format(self.name, self.help_text),
+            '# TYPE {} counter'.format(self.name),
+        ]
+        with self.lock:
+            series = sorted(self.series.items())
+        for label_value, value in series:
+            lines.append('{}{{{}="{}"}} {}'.format(
+                self.name, self.label, label_value, value,
+            ))
+        return lines
+
+
+class CacheMetrics:
+    """The stats of an `LRUCache`, as counters and gauges."""
+
+    def __init__(self, name, help_text, cache):
+        self.name = name
+        self.help_text = help_text
+        self.cache = cache
+
+    def render(self):
+        """Return the lines for this cache in the text format."""
+        stats = self.cache.stats()
+        lines = []
+        for stat, kind in (('hits', 'counter'), ('misses', 'counter'),
+                           ('evictions', 'counter'), ('size', 'gauge'),
+                           ('capacity', 'gauge')):
+            name = '{}_{}'.format(self.name, stat)
+            if kind == 'counter':
+                name += '_total'
+            lines += [
+                '# HELP {} {} ({})'.format(name, self.help_text, stat),
+                '# TYPE {} {}'.format(name, kind),
+                '{} {}'.format(name, stats[stat]),
+            ]
+        return lines
+
+
+STAGE_SECONDS = Histogram(
+    'frank_stage_seconds',
+    'Time spent in each stage of ingesting and showing invitations.',
+    'stage',
+)
+INVITATIONS = Counter(
+    'frank_invitations_total',
+    'Invitations handled by the ingest pipeline, by outcome.',
+    'outcome',
+)
+WHEN_SOURCES = Counter(
+    'frank_when_source_total',
+    'Where meeting times were read from: the calendar part or the When line.',
+    'source',
+)
+
+# Everything that gets rendered on /metrics. Other modules can add to this.
+METRICS = [STAGE_SECONDS, INVITATIONS, WHEN_SOURCES]
+
+
+@contextlib.contextmanager
+def timed(stage):
+    """Time the body of the `with` block as `stage`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(stage, time.perf_counter() - start)
+
+
+def render():
+    """Render all of the metrics in the Prometheus text format."""
+    lines = []
+    for metric in METRICS:
+        lines += metric.render()
+    return '\n'.join(lines) + '\n'
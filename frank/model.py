@@ -6,8 +6,12 @@ import enum
 
 from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import and_, text
+from sqlalchemy.dialects import postgresql
 
-from frank.utils import date_parses
+from frank import when
+from frank.metrics import CacheMetrics, METRICS
+from frank.utils import chunks, LRUCache
 
 
 db = SQLAlchemy()
@@ -76,19 +80,281 @@ def insert_or_create(index, key, fn):
     return obj
 
 
+# Creating the profiles that don't exist yet has to tolerate another request
+# creating them at the same time, so this lets the database sort out the race
+# on the unique `userid` instead of us.
+PROFILE_UPSERT = text(
+    'INSERT INTO profile (userid) VALUES (:userid) '
+    'ON CONFLICT (userid) DO NOTHING'
+)
+
+# The most parameters to put into a single `IN (...)` clause.
+IN_CHUNK = 500
+
+
+def resolve_profiles(userids):
+    """\
+    This returns an index from userid to `Profile` for all of `userids`,
+    creating any that don't exist yet. The index can be used with
+    `insert_or_create`.
+    """
+    userids = set(userids)
+    index = {}
+
+    for chunk in chunks(sorted(userids), IN_CHUNK):
+        query = Profile.query.filter(Profile.userid.in_(chunk))
+        index.update((prof.userid, prof) for prof in query)
+
+    # Sorting these keeps concurrent inserts taking locks in the same order.
+    missing = sorted(userids.difference(index))
+    if missing:
+        db.session.execute(
+            PROFILE_UPSERT, [{'userid': userid} for userid in missing],
+        )
+        for chunk in chunks(missing, IN_CHUNK):
+            query = Profile.query.filter(Profile.userid.in_(chunk))
+            index.update((prof.userid, prof) for prof in query)
+
+    return index
+
+
+SCHEDULE_BUMP = text(
+    'UPDATE profile SET schedule_version = schedule_version + 1 '
+    'WHERE id = :id'
+)
+
+
+def bump_schedules(profile_ids):
+    """\
+    This marks the meetings of `profile_ids` as changed. The rows are updated
+    in order, for the same reason as in `resolve_profiles`.
+    """
+    ids = sorted(set(profile_ids))
+    if ids:
+        db.session.execute(SCHEDULE_BUMP, [{'id': id_} for id_ in ids])
+
+
+INVITATION_TOUCH = text(
+    'UPDATE invitation SET version = version + 1, updated_at = :now '
+    'WHERE id = :id'
+)
+
+
+def touch_invitations(ids):
+    """\
+    This marks invitations as changed, by bumping their versions and
+    `updated_at`, and drops their pages from `PAGE_CACHE`. Call it, in the
+    same transaction, after any write to the invitations or their attendee
+    rows.
+    """
+    ids = sorted(set(ids))
+    now = datetime.datetime.utcnow()
+    if ids:
+        db.session.execute(
+            INVITATION_TOUCH, [{'id': id_, 'now': now} for id_ in ids],
+        )
+    for id_ in ids:
+        PAGE_CACHE.pop(id_)
+
+
+# The periods that consults are rolled up by. Weeks start on Monday.
+ROLLUP_PERIODS = ('day', 'week', 'month')
+
+ROLLUP_ADD = text(
+    'INSERT INTO consult_rollup '
+    '(profile_id, period, period_start, consults, minutes) '
+    'VALUES (:profile_id, :period, :period_start, :consults, :minutes) '
+    'ON CONFLICT (profile_id, period, period_start) DO UPDATE SET '
+    'consults = consult_rollup.consults + excluded.consults, '
+    'minutes = consult_rollup.minutes + excluded.minutes'
+)
+
+
+def period_start(period, day):
+    """Return the first day of the `period` that the date `day` is in."""
+    if period == 'day':
+        return day
+    elif period == 'week':
+        return day - datetime.timedelta(days=day.weekday())
+    elif period == 'month':
+        return day.replace(day=1)
+    raise ValueError('unknown period: {!r}'.format(period))
+
+
+def roll_up(attended, sign=1):
+    """\
+    This adds the (profile ID, meeting date, duration) of each consult that
+    a profile attended to the rollups, or takes them out if `sign` is -1.
+    Call it, in the same transaction, whenever consult attendees are written.
+    """
+    tallies = {}
+    for (profile_id, meeting_date, duration) in attended:
+        day = meeting_date.date()
+        for period in ROLLUP_PERIODS:
+            key = (profile_id, period, period_start(period, day))
+            tally = tallies.setdefault(key, [0, 0])
+            tally[0] += sign
+            tally[1] += sign * (duration or 0)
+    # In order, for the same reason as in `resolve_profiles`.
+    if tallies:
+        db.session.execute(ROLLUP_ADD, [
+            {'profile_id': profile_id, 'period': period,
+             'period_start': start, 'consults': consults,
+             'minutes': minutes}
+            for ((profile_id, period, start), (consults, minutes))
+            in sorted(tallies.items())
+        ])
+
+
+def find_invitations(dedupe_keys):
+    """\
+    This returns an index from dedupe key to the ID of the invitation that
+    has it, for the keys in `dedupe_keys` that have already been ingested.
+    """
+    index = {}
+    for chunk in chunks(sorted(set(dedupe_keys)), IN_CHUNK):
+        query = db.session.query(Invitation.dedupe_key, Invitation.id) \
+            .filter(Invitation.dedupe_key.in_(chunk))
+        index.update(query)
+    return index
+
+
+def encode_recur_param(recur, recur_param):
+    """\
+    This turns a `recur_param`, as documented on `MeetingTime`, into the
+    string that's stored in `Invitation.recur_param`. Annual parameters are
+    stored as 'month/day'.
+    """
+    if recur_param is None:
+        return None
+    if recur == RecurPeriod.annually:
+        return '{}/{}'.format(*recur_param)
+    return str(recur_param)
+
+
+def decode_recur_param(recur, value):
+    """This is the inverse of `encode_recur_param`."""
+    if value is None or value == '':
+        return None
+    if recur == RecurPeriod.annually:
+        (month, day) = value.split('/')
+        return (int(month), int(day))
+    return int(value)
+
+
+# Each pair is only in these once, and they're looked up from both ends: by
+# the primary key from the invitation or consult, and by the index from the
+# profile.
 invitation_attendees = db.Table(
     'attendees',
-    db.Column('invitation_id', db.Integer, db.ForeignKey('invitation.id')),
-    db.Column('profile_id', db.Integer, db.ForeignKey('profile.id')),
+    db.Column('invitation_id', db.Integer, db.ForeignKey('invitation.id'),
+              primary_key=True),
+    db.Column('profile_id', db.Integer, db.ForeignKey('profile.id'),
+              primary_key=True),
+    db.Index('ix_attendees_profile_id_invitation_id',
+             'profile_id', 'invitation_id'),
 )
 
+# The most rows to write in one multi-row INSERT. Two columns each keeps
+# them under the 999 parameters that older SQLites allow.
+VALUES_CHUNK = 400
+
+
+def insert_new(table):
+    """\
+    This returns an INSERT into `table` that skips rows that would break one
+    of its unique constraints. On Postgres, another transaction can write
+    the same rows after this one checked for them; SQLite only has one
+    writer at a time, so there it's a plain INSERT.
+    """
+    if db.engine.dialect.name == 'postgresql':
+        return postgresql.insert(table).on_conflict_do_nothing()
+    return table.insert()
+
+
+def insert_rows(table, rows, new_only=False):
+    """\
+    This writes `rows` into `table` with as few multi-row INSERTs as it can,
+    instead of one statement or executemany round for each row. With
+    `new_only`, rows that are already there are skipped, as by `insert_new`.
+    """
+    insert = insert_new(table) if new_only else table.insert()
+    for chunk in chunks(rows, VALUES_CHUNK):
+        db.session.execute(insert.values(chunk))
+
+
+class AttendeeMixin:
+    """\
+    This is a mixin class for models with attendees in an association table.
+    It writes and removes the association rows in bulk, instead of one for
+    each `Profile` appended to the relationship.
+
+    Classes set `attendee_table` and `attendee_key`, the name of the column
+    in it that refers to them. The object needs an `id`, so flush it first.
+    """
+
+    def _attendee_ids(self):
+        """Return the set of profile IDs that are already attendees."""
+        table = self.attendee_table
+        query = db.session.query(table.c.profile_id) \
+            .filter(table.c[self.attendee_key] == self.id)
+        return {profile_id for (profile_id,) in query}
+
+    def attendees_changed(self, added=(), removed=()):
+        """\
+        This is called after the attendees are written, with the IDs of the
+        profiles that were `added` and `removed`.
+        """
+        db.session.expire(self, ['attendees'])
+
+    def attach_attendees(self, profile_ids):
+        """\
+        Add the profiles with `profile_ids` as attendees, skipping any that
+        already are. This returns how many were added.
+        """
+        new_ids = sorted(set(profile_ids).difference(self._attendee_ids()))
+        insert_rows(self.attendee_table, [
+            {self.attendee_key: self.id, 'profile_id': profile_id}
+            for profile_id in new_ids
+        ])
+        if new_ids:
+            self.attendees_changed(added=new_ids)
+        return len(new_ids)
+
+    def detach_attendees(self, profile_ids):
+        """Remove the profiles with `profile_ids` from the attendees."""
+        table = self.attendee_table
+        old_ids = sorted(self._attendee_ids().intersection(profile_ids))
+        for chunk in chunks(old_ids, IN_CHUNK):
+            db.session.execute(table.delete().where(and_(
+                table.c[self.attendee_key] == self.id,
+                table.c.profile_id.in_(chunk),
+            )))
+        if old_ids:
+            self.attendees_changed(removed=old_ids)
+
+
+# The values of `Invitation.status`.
+CANCELED = -1
+PENDING = 0
+DONE = 1
+
+
+class Invitation(db.Model, RecurMixin, AttendeeMixin):
+    # These are for listing invitations in order of their meeting dates, by
+    # owner and by status.
+    __table_args__ = (
+        db.Index('ix_invitation_owner_id_meeting_date',
+                 'owner_id', 'meeting_date'),
+        db.Index('ix_invitation_status_meeting_date',
+                 'status', 'meeting_date'),
+    )
 
-class Invitation(db.Model, RecurMixin):
     id = db.Column(db.Integer, primary_key=True)
     subject = db.Column(db.String(256))
     body = db.Column(db.Text())
 
-    meeting_date = db.Column(db.DateTime(), nullable=False)
+    meeting_date = db.Column(db.DateTime(), nullable=False, index=True)
     duration = db.Column(db.Integer())
 
     # A value from RecurPeriod
@@ -107,33 +373,205 @@ class Invitation(db.Model, RecurMixin):
     owner_id = db.Column(db.Integer, db.ForeignKey('profile.id'))
     owner = db.relationship('Profile', back_populates='invitations_owned')
 
+    # A SHA-256 of the message's Message-ID, or of its contents if it doesn't
+    # have one. Relays retry and Outlook re-sends, so this is how we recognize
+    # a message we've already seen.
+    dedupe_key = db.Column(db.String(64), nullable=True, unique=True,
+                           index=True)
+
     attendees = db.relationship('Profile', secondary=invitation_attendees,
                                 back_populates='invitations')
+    attendee_table = invitation_attendees
+    attendee_key = 'invitation_id'
+
+    # This goes up on every write to the invitation or its attendees, through
+    # `touch_invitations`, so the cached pages for it can tell they're stale.
+    version = db.Column(db.Integer, nullable=False, default=0,
+                        server_default='0')
+    # When `version` last went up, in UTC.
+    updated_at = db.Column(db.DateTime(), nullable=False,
+                           default=datetime.datetime.utcnow,
+                           server_default=text('CURRENT_TIMESTAMP'))
+
+    attachments = db.relationship('Attachment', back_populates='invitation')
+
+    # The meetings this one clashed with when it came in, and the ones that
+    # came in later and clashed with it.
+    conflicts = db.relationship(
+        'Conflict', foreign_keys='Conflict.invitation_id',
+        back_populates='invitation',
+    )
+    conflicted_by = db.relationship(
+        'Conflict', foreign_keys='Conflict.other_id', back_populates='other',
+    )
+
+    # One for a single meeting that's done, or one for each occurrence of a
+    # recurring one that has started. See `frank.consults`.
+    consults = db.relationship('Consult', back_populates='invitation',
+                               order_by='Consult.meeting_date')
+
+    def attendees_changed(self, added=(), removed=()):
+        super().attendees_changed(added, removed)
+        touch_invitations([self.id])
+        # `frank.occurrences` imports this module.
+        from frank.occurrences import refresh_occurrences
+        # The profiles that were removed aren't participants any more, so
+        # `refresh_occurrences` doesn't bump their schedules.
+        bump_schedules(removed)
+        refresh_occurrences([self.id])
+
+    @property
+    def recurring(self):
+        """Does this meet more than once?"""
+        return self.recur not in (None, RecurPeriod.none)
+
+    @property
+    def recurrence(self):
+        """\
+        This returns the (recur, recur_param) for this invitation, with
+        `recur_param` decoded from how it's stored.
+        """
+        recur = self.recur or RecurPeriod.none
+        return (recur, decode_recur_param(recur, self.recur_param))
+
+
+class Attachment(db.Model):
+    """\
+    The metadata for a file that came with an invitation. The contents are in
+    the store in `frank.attachments`, under `sha256`.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    invitation_id = db.Column(db.Integer, db.ForeignKey('invitation.id'),
+                              nullable=False, index=True)
+    invitation = db.relationship('Invitation', back_populates='attachments')
+
+    sha256 = db.Column(db.String(64), nullable=False, index=True)
+    filename = db.Column(db.String(256))
+    content_type = db.Column(db.String(128))
+    size = db.Column(db.Integer, nullable=False)
+
+
+class Occurrence(db.Model):
+    """\
+    One occurrence of an invitation for one of its participants, owner or
+    attendee, materialized from the invitation's recurrence by
+    `frank.occurrences` so range queries don't have to expand recurrences.
+    """
+    __table_args__ = (
+        db.Index('ix_occurrence_profile_id_start_time',
+                 'profile_id', 'start_time'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    invitation_id = db.Column(db.Integer, db.ForeignKey('invitation.id'),
+                              nullable=False, index=True)
+    profile_id = db.Column(db.Integer, db.ForeignKey('profile.id'),
+                           nullable=False)
+    start_time = db.Column(db.DateTime(), nullable=False, index=True)
+    end_time = db.Column(db.DateTime(), nullable=False)
+
+
+class Conflict(db.Model):
+    """\
+    An invitation that overlapped another meeting of one of its participants
+    when it was ingested.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    invitation_id = db.Column(db.Integer, db.ForeignKey('invitation.id'),
+                              nullable=False, index=True)
+    invitation = db.relationship('Invitation', foreign_keys=[invitation_id],
+                                 back_populates='conflicts')
+    other_id = db.Column(db.Integer, db.ForeignKey('invitation.id'),
+                         nullable=False, index=True)
+    other = db.relationship('Invitation', foreign_keys=[other_id],
+                            back_populates='conflicted_by')
+    profile_id = db.Column(db.Integer, db.ForeignKey('profile.id'),
+                           nullable=False)
+    profile = db.relationship('Profile')
+
+
+class OccurrenceHorizon(db.Model):
+    """\
+    The window that the `occurrence` table has been filled for. There's at
+    most one row, and none until the table has been built.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    start_time = db.Column(db.DateTime(), nullable=False)
+    end_time = db.Column(db.DateTime(), nullable=False)
 
 
 consult_attendees = db.Table(
     'consult_attendees',
-    db.Column('consult_id', db.Integer, db.ForeignKey('consult.id')),
-    db.Column('profile_id', db.Integer, db.ForeignKey('profile.id')),
+    db.Column('consult_id', db.Integer, db.ForeignKey('consult.id'),
+              primary_key=True),
+    db.Column('profile_id', db.Integer, db.ForeignKey('profile.id'),
+              primary_key=True),
+    db.Index('ix_consult_attendees_profile_id_consult_id',
+             'profile_id', 'consult_id'),
 )
 
 
-class Consult(db.Model):
+class Consult(db.Model, AttendeeMixin):
+    # There's only one consult for each meeting an invitation was for, so
+    # making them again can't duplicate them.
+    __table_args__ = (
+        db.Index('ix_consult_from_invitation_meeting_date',
+                 'from_invitation', 'meeting_date', unique=True),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     from_invitation = db.Column(db.Integer, db.ForeignKey('invitation.id'))
+    invitation = db.relationship('Invitation', back_populates='consults')
 
     meeting_date = db.Column(db.DateTime(), nullable=False)
     duration = db.Column(db.Integer)
     attendees = db.relationship('Profile', secondary=consult_attendees,
                                 back_populates='consults')
+    attendee_table = consult_attendees
+    attendee_key = 'consult_id'
 
     notes = db.Text()
 
+    def attendees_changed(self, added=(), removed=()):
+        super().attendees_changed(added, removed)
+        roll_up((profile_id, self.meeting_date, self.duration)
+                for profile_id in added)
+        roll_up(((profile_id, self.meeting_date, self.duration)
+                 for profile_id in removed), -1)
+
+
+class ConsultRollup(db.Model):
+    """\
+    The number of consults each profile attended, and their total minutes,
+    for each day, week, and month. These are kept up to date by `roll_up`,
+    so stats don't have to scan the consults.
+    """
+    __table_args__ = (
+        db.Index('ix_consult_rollup_period_period_start',
+                 'period', 'period_start'),
+    )
+
+    profile_id = db.Column(db.Integer, db.ForeignKey('profile.id'),
+                           primary_key=True)
+    # One of `ROLLUP_PERIODS`.
+    period = db.Column(db.String(5), primary_key=True)
+    period_start = db.Column(db.Date(), primary_key=True)
+
+    consults = db.Column(db.Integer, nullable=False, default=0)
+    minutes = db.Column(db.Integer, nullable=False, default=0)
+
+    profile = db.relationship('Profile')
+
 
 class Profile(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     userid = db.Column(db.String(32), unique=True, nullable=False)
 
+    # This goes up whenever the profile's meetings change, so cached copies
+    # of them can tell whether they're stale.
+    schedule_version = db.Column(db.Integer, nullable=False, default=0,
+                                 server_default='0')
+
     invitations_owned = db.relationship('Invitation', back_populates='owner')
     invitations = db.relationship('Invitation', secondary=invitation_attendees,
                                   back_populates='attendees')
@@ -147,6 +585,32 @@ class ErrorReport(db.Model):
     stacktrace = db.Column(db.String)
     route = db.Column(db.String(75))
 
+    # Repeats of an error are counted on one row, found by this hash of its
+    # route and stacktrace. See `frank.errors`.
+    fingerprint = db.Column(db.String(64), nullable=True, unique=True,
+                            index=True)
+    count = db.Column(db.Integer, nullable=False, default=1,
+                      server_default='1')
+    first_seen = db.Column(db.DateTime)
+    last_seen = db.Column(db.DateTime)
+
+
+# Parsed When lines, keyed on the line with its whitespace normalized and the
+# year it was parsed in, since annually recurring lines are checked against
+# the current year.
+WHEN_CACHE = LRUCache(4096)
+METRICS.append(CacheMetrics(
+    'frank_when_cache', 'Cache of parsed When lines', WHEN_CACHE,
+))
+
+# Rendered invitation pages, keyed on the invitation's ID, holding its
+# (version, day, HTML). The page has relative dates in it, so it's only good
+# for the day it was rendered.
+PAGE_CACHE = LRUCache(512)
+METRICS.append(CacheMetrics(
+    'frank_page_cache', 'Cache of rendered invitation pages', PAGE_CACHE,
+))
+
 
 class MeetingTime(RecurMixin):
     """\
@@ -180,122 +644,43 @@ class MeetingTime(RecurMixin):
 
     @classmethod
     def parse(cls, line):
-        """Parse a 'When' line from an invitation into a MeetingTime."""
-        if line.startswith('Occurs '):
-            meeting_time = cls.parse_recurring(line)
-        else:
-            meeting_time = cls.parse_once(line)
-        return meeting_time
+        """\
+        Parse a 'When' line from an invitation into a MeetingTime. This is
+        cached, but each call returns a new MeetingTime.
+        """
+        line = ' '.join(line.split())
+        year = datetime.date.today().year
+        key = (line, year)
+        parsed = WHEN_CACHE.get(key)
+        if parsed is None:
+            parsed = when.parse(line, year)
+            WHEN_CACHE.put(key, parsed)
+        return cls.from_parsed(parsed)
 
     @classmethod
     def parse_once(cls, line):
         """\
         Parse a 'When' line from sole-occuring invitation into a MeetingTime.
         """
-
-        # Wednesday, April 20, 2016 9:00 PM-10:00 PM (UTC-05:00)
-        # 0: Wednesday,
-        # 1: April
-        # 2: 20,
-        # 3: 2016
-        # 4: 9:00
-        # 5: PM-10:00
-        # 6: PM
-        # 7: (UTC-05:00)
-        parts = line.split()
-        parts[6] = parts[6].replace('.', '')
-        parts[7] = parts[7].replace(':', '')
-        parts2 = parts[5].split('-')
-
-        d_str = ' '.join(parts[:5] + [parts2[0], parts[7]])
-        start = datetime.datetime.strptime(
-            d_str, '%A, %B %d, %Y %I:%M %p (%Z%z)',
-            )
-
-        dend = datetime.datetime.strptime(
-            ' '.join(parts[:4] + [parts2[1]] + parts[6:8]),
-            '%A, %B %d, %Y %I:%M %p (%Z%z)',
-        )
-
-        meeting_time = MeetingTime()
-        meeting_time.start_time = start
-        meeting_time.duration = dend - start
-        meeting_time.recur_off()
-        return meeting_time
+        return cls.from_parsed(when.parse_once(line))
 
     @classmethod
     def parse_recurring(cls, line):
         """\
         Parse a 'When' line from a recurring invitation into a MeetingTime.
         """
+        return cls.from_parsed(when.parse_recurring(line))
 
-        meeting_time = MeetingTime()
-        now = datetime.datetime.now()
-        words = line.split()
-        prefix = ' '.join(words[:3])
-
-        # daily
-        if line.startswith('Occurs every day from '):
-            start_str = '%s %s %s' % (words[10], words[4], words[5])
-            start = datetime.datetime.strptime(
-                start_str, '%m/%d/%Y. %I:%M %p',
-                )
-            end_str = '%s %s %s' % (words[10], words[7], words[8])
-            end = datetime.datetime.strptime(
-                end_str, '%m/%d/%Y. %I:%M %p',
-                )
-            meeting_time.recur_daily()
-
-        # weekly
-        elif date_parses(prefix, 'Occurs every %A'):
-            start_str = '%s %s %s' % (words[10], words[4], words[5])
-            start = datetime.datetime.strptime(start_str, '%m/%d/%Y. %I:%M %p')
-            end_str = '%s %s %s' % (words[10], words[7], words[8])
-            end = datetime.datetime.strptime(end_str, '%m/%d/%Y. %I:%M %p')
-
-            weekday_str = words[2]
-            step = start
-            day = datetime.timedelta(days=1)
-            while True:
-                if step.strftime('%A') == weekday_str:
-                    weekday = step.weekday()
-                    break
-                step = step + day
-            else:
-                raise Exception('Invalid weekday: "{}"'.format(weekday_str))
-
-            meeting_time.recur_weekly(weekday)
-
-        # monthly
-        elif line.startswith('Occurs every month on day '):
-            day = int(words[5])
-            start_str = '%s %s %s' % (words[16], words[10], words[11])
-            start = datetime.datetime.strptime(start_str, '%m/%d/%Y. %I:%M %p')
-            end_str = '%s %s %s' % (words[16], words[13], words[14])
-            end = datetime.datetime.strptime(end_str, '%m/%d/%Y. %I:%M %p')
-            meeting_time.recur_monthly(day)
-
-        # annually
-        elif date_parses(prefix, 'Occurs every %B'):
-            start_str = '%s %s, %s, %s %s' % (
-                words[2], words[3], now.year, words[5], words[6],
-                )
-            start = datetime.datetime.strptime(
-                start_str, '%B %d, %Y, %I:%M %p',
-                )
-            start_date = datetime.datetime.strptime(words[11], '%m/%d/%Y.')
-            start = datetime.datetime.combine(start_date.date(), start.time())
-            end_str = '%s %s, %s, %s %s' % (
-                words[2], words[3], start.year, words[8], words[9],
-                )
-            end = datetime.datetime.strptime(
-                end_str, '%B %d, %Y, %I:%M %p',
-                )
-            meeting_time.recur_annually(start.month, start.day)
-
-        else:
-            raise Exception('Invalid "when" line: "{}"'.format(line))
-
+    @classmethod
+    def from_parsed(cls, parsed):
+        """\
+        Create a MeetingTime from the (start, end, recur, recur_param) tuple
+        that `frank.when` parses lines into.
+        """
+        (start, end, recur, recur_param) = parsed
+        meeting_time = cls()
         meeting_time.start_time = start
         meeting_time.duration = end - start
+        meeting_time.recur = RecurPeriod[recur]
+        meeting_time.recur_param = recur_param
         return meeting_time
@@ -0,0 +1,236 @@
+"""\
+Keeping the materialized `occurrence` table up to date.
+
+The table holds a row for each participant in each occurrence that starts
+inside the horizon in `OccurrenceHorizon`. Invitations are refreshed as
+they're ingested, and `python -m frank.manage occurrences extend` moves the
+horizon along, dropping the rows that fall out of the start of it. Until
+`python -m frank.manage occurrences rebuild` has been run, there's no
+horizon, and reads expand recurrences as they go.
+"""
+
+
+import datetime
+
+from sqlalchemy import or_
+
+from frank import recurrence
+from frank.model import (
+    bump_schedules, db, invitation_attendees, IN_CHUNK, Invitation,
+    Occurrence, OccurrenceHorizon,
+)
+from frank.utils import chunks
+
+
+# How far ahead of today `extend` and `rebuild` fill the table, by default.
+HORIZON_DAYS = 365
+# How far back from today `rebuild` starts, by default.
+HISTORY_DAYS = 30
+
+
+def current_horizon():
+    """Return the `OccurrenceHorizon`, or None if the table isn't built."""
+    return OccurrenceHorizon.query.first()
+
+
+def participants(ids):
+    """\
+    This returns an index from invitation ID to the profile IDs of its owner
+    and attendees, for the invitations with `ids`.
+    """
+    index = {}
+    for chunk in chunks(sorted(set(ids)), IN_CHUNK):
+        owners = db.session.query(Invitation.id, Invitation.owner_id) \
+            .filter(Invitation.id.in_(chunk))
+        for (invite_id, owner_id) in owners:
+            index[invite_id] = [] if owner_id is None else [owner_id]
+
+        attendees = db.session.query(
+            invitation_attendees.c.invitation_id,
+            invitation_attendees.c.profile_id,
+        ).filter(invitation_attendees.c.invitation_id.in_(chunk))
+        for (invite_id, profile_id) in attendees:
+            profiles = index.setdefault(invite_id, [])
+            if profile_id not in profiles:
+                profiles.append(profile_id)
+    return index
+
+
+def materialize(ids, start, end):
+    """\
+    This inserts the rows for the occurrences of the invitations with `ids`
+    that start from `start` up to `end`, and returns how many there were.
+    It doesn't delete any that are already there.
+    """
+    count = 0
+    for chunk in chunks(sorted(set(ids)), IN_CHUNK):
+        found = [
+            occurrence for occurrence in recurrence.expand(
+                recurrence.invitation_rows(start, end, ids=chunk), start, end,
+            )
+            if occurrence.start >= start
+        ]
+        index = participants(occurrence.invitation_id for occurrence in found)
+        rows = [
+            {
+                'invitation_id': occurrence.invitation_id,
+                'profile_id': profile_id,
+                'start_time': occurrence.start,
+                'end_time': occurrence.end,
+            }
+            for occurrence in found
+            for profile_id in index.get(occurrence.invitation_id, ())
+        ]
+        if rows:
+            db.session.execute(Occurrence.__table__.insert(), rows)
+        count += len(rows)
+    return count
+
+
+def refresh_occurrences(ids):
+    """\
+    This replaces the occurrences of the invitations with `ids` inside the
+    horizon. Call it, in the same transaction, whenever invitations are
+    inserted, changed, or canceled. This also bumps the schedule versions of
+    their participants. If there's no horizon yet, that's all it does.
+    """
+    ids = sorted(set(ids))
+    bump_schedules(
+        profile_id
+        for profiles in participants(ids).values()
+        for profile_id in profiles
+    )
+    horizon = current_horizon()
+    if horizon is None:
+        return 0
+    for chunk in chunks(ids, IN_CHUNK):
+        Occurrence.query.filter(Occurrence.invitation_id.in_(chunk)) \
+            .delete(synchronize_session=False)
+    return materialize(ids, horizon.start_time, horizon.end_time)
+
+
+def invitation_batches(size):
+    """This yields the IDs of all the invitations, `size` at a time."""
+    last_id = 0
+    while True:
+        ids = [
+            invite_id for (invite_id,) in db.session.query(Invitation.id)
+            .filter(Invitation.id > last_id)
+            .order_by(Invitation.id)
+            .limit(size)
+        ]
+        if not ids:
+            break
+        yield ids
+        last_id = ids[-1]
+
+
+def fill(start, end, batch, progress=None):
+    """\
+    This fills in the occurrences from `start` up to `end` for all of the
+    invitations, committing after each `batch` of them. Rows already in that
+    range for the batch are replaced, in case an ingest refreshed the
+    invitation while this was running. `progress` is called with the number
+    of rows after each batch.
+    """
+    count = 0
+    for ids in invitation_batches(batch):
+        Occurrence.query.filter(
+            Occurrence.invitation_id.in_(ids),
+            Occurrence.start_time >= start,
+            Occurrence.start_time < end,
+        ).delete(synchronize_session=False)
+        count += materialize(ids, start, end)
+        db.session.commit()
+        if progress is not None:
+            progress(count)
+    return count
+
+
+def _set_horizon(horizon, start, end):
+    """Save the horizon before filling it, so ingests refresh inside it."""
+    if horizon is None:
+        horizon = OccurrenceHorizon()
+        db.session.add(horizon)
+    horizon.start_time = start
+    horizon.end_time = end
+    db.session.commit()
+
+
+def extend_horizon(start, end, batch=1000, progress=None):
+    """\
+    This moves the horizon along to run from `start` up to `end`. The
+    occurrences that start before `start` are deleted, and the ones between
+    the old end and `end` are filled in. Neither end is moved back; rebuild
+    the table for that. It returns the number of rows added.
+    """
+    horizon = current_horizon()
+    if horizon is None:
+        raise ValueError('the occurrence table has not been built')
+    old_end = horizon.end_time
+    start = max(start, horizon.start_time)
+    end = max(end, old_end)
+    if start > horizon.start_time:
+        # The horizon moves first, so reads stop using the rows that are
+        # about to go.
+        _set_horizon(horizon, start, old_end)
+        Occurrence.query.filter(Occurrence.start_time < start) \
+            .delete(synchronize_session=False)
+        db.session.commit()
+    if end <= old_end:
+        return 0
+    _set_horizon(horizon, start, end)
+    return fill(old_end, end, batch, progress)
+
+
+def rebuild(start, end, batch=1000, progress=None):
+    """\
+    This empties the occurrence table and fills it again from `start` up to
+    `end`. It returns the number of rows.
+    """
+    Occurrence.query.delete(synchronize_session=False)
+    _set_horizon(current_horizon(), start, end)
+    return fill(start, end, batch, progress)
+
+
+def default_window(days=HORIZON_DAYS, history=HISTORY_DAYS):
+    """\
+    This returns the (start, end) of a horizon that starts `history` days
+    before today and ends `days` after it.
+    """
+    today = datetime.datetime.combine(datetime.date.today(), datetime.time())
+    return (today - datetime.timedelta(days=history),
+            today + datetime.timedelta(days=days))
+
+
+def stored_occurrences(start, end, profile_id=None):
+    """\
+    This reads the occurrences that overlap `start` up to `end` from the
+    occurrence table, as `recurrence.Occurrence`s.
+    """
+    query = db.session.query(
+        Occurrence.invitation_id, Occurrence.start_time, Occurrence.end_time,
+    ).filter(
+        Occurrence.start_time >= start - recurrence.LONGEST_MEETING,
+        Occurrence.start_time < end,
+        or_(Occurrence.end_time > start, Occurrence.start_time >= start),
+    )
+    if profile_id is not None:
+        query = query.filter(Occurrence.profile_id == profile_id)
+    query = query.distinct() \
+        .order_by(Occurrence.start_time, Occurrence.invitation_id)
+    return [recurrence.Occurrence(*row) for row in query]
+
+
+def occurrences_between(start, end, profile_id=None):
+    """\
+    This returns the occurrences between `start` and `end`, from the table
+    if the horizon covers them, or by expanding the invitations if it
+    doesn't.
+    """
+    horizon = current_horizon()
+    if (horizon is not None and
+            horizon.start_time <= start - recurrence.LONGEST_MEETING and
+            end <= horizon.end_time):
+        return stored_occurrences(start, end, profile_id)
+    return recurrence.occurrences(start, end, profile_id)
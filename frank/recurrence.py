@@ -0,0 +1,207 @@
+"""\
+Expanding invitations into the occurrences that fall in a window of time.
+
+The days that a recurring meeting falls on are worked out as NumPy
+datetime64 arrays, one array per invitation, so a year-long window costs
+about the same as a week-long one.
+"""
+
+
+import collections
+import datetime
+
+import numpy as np
+from sqlalchemy import or_
+
+from frank.model import (
+    db, decode_recur_param, invitation_attendees, Invitation, RecurPeriod,
+)
+
+
+Occurrence = collections.namedtuple(
+    'Occurrence', ['invitation_id', 'start', 'end'],
+)
+
+# Day 0 of datetime64[D], 1970-01-01, was a Thursday.
+EPOCH_WEEKDAY = 3
+
+# Sole-occuring meetings that start this long before a window are still
+# looked at, in case they run into it.
+LONGEST_MEETING = datetime.timedelta(days=1)
+
+NO_DAYS = np.array([], dtype='datetime64[D]')
+
+
+def _naive(value):
+    """Drop the time zone from `value`. Meetings are stored in local time."""
+    return value.replace(tzinfo=None)
+
+
+def weekdays(days):
+    """The weekday, Monday = 0, to 6, of each of a datetime64[D] array."""
+    return (days.astype('int64') + EPOCH_WEEKDAY) % 7
+
+
+def _month_days(months, month_day):
+    """\
+    This returns the `month_day` of each of a datetime64[M] array, skipping
+    months that are too short to have it. Negative days count back from the
+    end of the month, so -1 is the last day.
+    """
+    if month_day > 0:
+        days = months.astype('datetime64[D]') + (month_day - 1)
+    elif month_day < 0:
+        days = (months + 1).astype('datetime64[D]') + month_day
+    else:
+        return NO_DAYS
+    return days[days.astype('datetime64[M]') == months]
+
+
+def occurrence_days(first, recur, recur_param, lo, hi):
+    """\
+    This returns a datetime64[D] array of the days, from `lo` to `hi`
+    inclusive, that a meeting first held on `first` falls on. `recur` and
+    `recur_param` are as documented on `MeetingTime`.
+    """
+    first = np.datetime64(first, 'D')
+    lo = max(first, np.datetime64(lo, 'D'))
+    hi = np.datetime64(hi, 'D')
+    if hi < lo:
+        return NO_DAYS
+
+    if recur in (None, RecurPeriod.none):
+        days = np.array([first])
+
+    elif recur == RecurPeriod.daily:
+        days = np.arange(lo, hi + 1)
+
+    elif recur == RecurPeriod.weekly:
+        offset = (recur_param - weekdays(np.array([lo]))[0]) % 7
+        days = np.arange(lo + offset, hi + 1, 7)
+
+    elif recur == RecurPeriod.monthly:
+        months = np.arange(
+            lo.astype('datetime64[M]'), hi.astype('datetime64[M]') + 1,
+        )
+        days = _month_days(months, recur_param)
+
+    elif recur == RecurPeriod.annually:
+        (month, day) = recur_param
+        years = np.arange(
+            lo.astype('datetime64[Y]'), hi.astype('datetime64[Y]') + 1,
+        )
+        days = _month_days(years.astype('datetime64[M]') + (month - 1), day)
+
+    else:
+        raise ValueError('unknown recurrence: {!r}'.format(recur))
+
+    return days[(days >= lo) & (days <= hi)]
+
+
+def expand(rows, start, end):
+    """\
+    This expands `rows` of (invitation ID, meeting date, duration in
+    minutes, recur, recur_param) into a list of the `Occurrence`s that
+    overlap the window from `start` up to `end`, sorted by when they start.
+    `recur_param` is decoded, as it is on `MeetingTime`.
+    """
+    start = _naive(start)
+    end = _naive(end)
+    window_start = np.datetime64(start, 's')
+    window_end = np.datetime64(end, 's')
+
+    ids = []
+    starts = []
+    ends = []
+    for (invite_id, meeting_date, duration, recur, recur_param) in rows:
+        meeting_date = _naive(meeting_date)
+        length = datetime.timedelta(minutes=duration or 0)
+        days = occurrence_days(
+            meeting_date.date(), recur, recur_param,
+            (start - length).date(), end.date(),
+        )
+        if not len(days):
+            continue
+
+        time_of_day = meeting_date - datetime.datetime.combine(
+            meeting_date.date(), datetime.time(),
+        )
+        occ_starts = (days.astype('datetime64[s]') +
+                      np.timedelta64(time_of_day, 's'))
+        occ_ends = occ_starts + np.timedelta64(length, 's')
+        overlaps = (occ_starts < window_end) & (
+            (occ_ends > window_start) | (occ_starts >= window_start)
+        )
+        if overlaps.any():
+            occ_starts = occ_starts[overlaps]
+            starts.append(occ_starts)
+            ends.append(occ_ends[overlaps])
+            ids.append(np.full(len(occ_starts), invite_id, dtype='int64'))
+
+    if not ids:
+        return []
+    ids = np.concatenate(ids)
+    starts = np.concatenate(starts)
+    ends = np.concatenate(ends)
+    order = np.lexsort((ids, starts))
+    return [
+        Occurrence(*occurrence) for occurrence in zip(
+            ids[order].tolist(), starts[order].tolist(),
+            ends[order].tolist(),
+        )
+    ]
+
+
+def invitation_rows(start, end, ids=None, profile_id=None):
+    """\
+    This queries the rows for `expand` of the invitations that aren't
+    canceled and could have an occurrence between `start` and `end`. It can
+    be limited to the invitations with `ids`, or to the ones that the
+    profile `profile_id` is part of.
+    """
+    start = _naive(start)
+    end = _naive(end)
+    query = db.session.query(
+        Invitation.id, Invitation.meeting_date, Invitation.duration,
+        Invitation.recur, Invitation.recur_param,
+    ).filter(
+        Invitation.status != -1,
+        Invitation.meeting_date < end,
+        or_(
+            Invitation.meeting_date >= start - LONGEST_MEETING,
+            Invitation.recur.notin_([RecurPeriod.none]),
+        ),
+    )
+    if ids is not None:
+        query = query.filter(Invitation.id.in_(ids))
+    if profile_id is not None:
+        attending = db.session.query(invitation_attendees.c.invitation_id) \
+            .filter(invitation_attendees.c.profile_id == profile_id)
+        query = query.filter(or_(
+            Invitation.owner_id == profile_id, Invitation.id.in_(attending),
+        ))
+
+    for (invite_id, meeting_date, duration, recur, recur_param) in query:
+        recur = recur or RecurPeriod.none
+        yield (invite_id, meeting_date, duration, recur,
+               decode_recur_param(recur, recur_param))
+
+
+def occurrences(start, end, profile_id=None):
+    """\
+    This returns the `Occurrence`s of all the invitations that aren't
+    canceled, or of the ones `profile_id` is part of, between `start` and
+    `end`.
+    """
+    return expand(invitation_rows(start, end, profile_id=profile_id),
+                  start, end)
+
+
+def occurrences_of(invitation, start, end):
+    """This returns the `Occurrence`s of one `Invitation`."""
+    (recur, recur_param) = invitation.recurrence
+    return expand(
+        [(invitation.id, invitation.meeting_date, invitation.duration, recur,
+          recur_param)],
+        start, end,
+    )
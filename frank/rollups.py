@@ -0,0 +1,99 @@
+"""\
+Rebuilding and reading the consult rollups.
+
+`roll_up` keeps `ConsultRollup` current as consult attendees are written.
+`python -m frank.manage rebuild_rollups` recomputes it from the consults, a
+chunk of profiles at a time.
+"""
+
+
+import datetime
+
+from frank.model import (
+    consult_attendees, db, roll_up, Consult, ConsultRollup, Profile,
+)
+
+
+def profile_batches(size):
+    """This yields the IDs of all the profiles, `size` at a time."""
+    last_id = 0
+    while True:
+        ids = [
+            profile_id for (profile_id,) in db.session.query(Profile.id)
+            .filter(Profile.id > last_id)
+            .order_by(Profile.id)
+            .limit(size)
+        ]
+        if not ids:
+            break
+        yield ids
+        last_id = ids[-1]
+
+
+def rebuild(batch=100, progress=None):
+    """\
+    This recomputes the rollups, committing after each `batch` of profiles,
+    so each profile's rollups are replaced all at once. `progress` is called
+    with the number of profiles done after each batch. It returns the number
+    of consult attendees rolled up.
+    """
+    done = 0
+    count = 0
+    for ids in profile_batches(batch):
+        ConsultRollup.query.filter(ConsultRollup.profile_id.in_(ids)) \
+            .delete(synchronize_session=False)
+        attended = db.session.query(
+            consult_attendees.c.profile_id, Consult.meeting_date,
+            Consult.duration,
+        ).join(Consult, Consult.id == consult_attendees.c.consult_id) \
+            .filter(consult_attendees.c.profile_id.in_(ids)) \
+            .all()
+        roll_up(attended)
+        db.session.commit()
+        done += len(ids)
+        count += len(attended)
+        if progress is not None:
+            progress(done)
+    return count
+
+
+def stats(period, start, end, profile_id=None):
+    """\
+    This returns the (userid, period start, consults, minutes) for each
+    profile, or just `profile_id`, in each `period` that starts from `start`
+    up to `end`, in order.
+    """
+    query = db.session.query(
+        Profile.userid, ConsultRollup.period_start, ConsultRollup.consults,
+        ConsultRollup.minutes,
+    ).select_from(ConsultRollup) \
+        .join(Profile, Profile.id == ConsultRollup.profile_id) \
+        .filter(ConsultRollup.period == period,
+                ConsultRollup.period_start >= start,
+                ConsultRollup.period_start < end,
+                ConsultRollup.consults > 0)
+    if profile_id is not None:
+        query = query.filter(ConsultRollup.profile_id == profile_id)
+    return query.order_by(Profile.userid, ConsultRollup.period_start).all()
+
+
+def default_range(period, today=None):
+    """\
+    This returns the (start, end) dates of the last twelve `period`s, up to
+    and including the current one.
+    """
+    today = today or datetime.date.today()
+    if period == 'day':
+        return (today - datetime.timedelta(days=11),
+                today + datetime.timedelta(days=1))
+    elif period == 'week':
+        monday = today - datetime.timedelta(days=today.weekday())
+        return (monday - datetime.timedelta(weeks=11),
+                monday + datetime.timedelta(weeks=1))
+    month = today.replace(day=1)
+    start_month = month.month - 11
+    start = month.replace(year=month.year + (start_month - 1) // 12,
+                          month=(start_month - 1) % 12 + 1)
+    end = month.replace(year=month.year + month.month // 12,
+                        month=month.month % 12 + 1)
+    return (start, end)
@@ -0,0 +1,96 @@
+"""\
+Moving pending invitations to done once their meetings have started.
+
+`python -m frank.manage schedule_statuses` runs this in a loop. Each batch
+is one set-based UPDATE, found through the (status, meeting_date) index, and
+more than one process can run it at once.
+"""
+
+
+import datetime
+
+from sqlalchemy import text
+
+from frank.consults import make_consults
+from frank.model import db, DONE, Invitation, PAGE_CACHE, PENDING
+
+
+# Postgres claims a batch and updates it in one statement. Rows that another
+# process has locked are skipped rather than waited on, so workers never
+# block each other or update the same rows.
+COMPLETE_BATCH = text('''
+UPDATE invitation
+SET status = :done, version = version + 1, updated_at = :now
+WHERE id IN (
+    SELECT id FROM invitation
+    WHERE status = :pending AND meeting_date < :cutoff
+    ORDER BY meeting_date
+    LIMIT :batch
+    FOR UPDATE SKIP LOCKED
+)
+RETURNING id
+''')
+
+
+def complete_batch(cutoff, batch):
+    """\
+    This marks up to `batch` pending invitations that start before `cutoff`
+    as done, makes their consults, commits, and returns their IDs.
+    """
+    now = datetime.datetime.utcnow()
+    if db.engine.dialect.name == 'postgresql':
+        result = db.session.execute(COMPLETE_BATCH, {
+            'done': DONE, 'pending': PENDING, 'now': now, 'cutoff': cutoff,
+            'batch': batch,
+        })
+        ids = [invite_id for (invite_id,) in result]
+    else:
+        # SQLite only has one writer at a time. Checking the status again in
+        # the UPDATE means rows another process got to first are skipped,
+        # and only the rows this one stamped with `now` are its own.
+        ids = [
+            invite_id for (invite_id,) in db.session.query(Invitation.id)
+            .filter(Invitation.status == PENDING,
+                    Invitation.meeting_date < cutoff)
+            .order_by(Invitation.meeting_date)
+            .limit(batch)
+        ]
+        if ids:
+            updated = db.session.query(Invitation) \
+                .filter(Invitation.id.in_(ids),
+                        Invitation.status == PENDING) \
+                .update({
+                    Invitation.status: DONE,
+                    Invitation.version: Invitation.version + 1,
+                    Invitation.updated_at: now,
+                }, synchronize_session=False)
+            if updated < len(ids):
+                ids = [
+                    invite_id for (invite_id,)
+                    in db.session.query(Invitation.id)
+                    .filter(Invitation.id.in_(ids),
+                            Invitation.status == DONE,
+                            Invitation.updated_at == now)
+                    .order_by(Invitation.meeting_date)
+                ]
+    make_consults(ids)
+    db.session.commit()
+
+    for invite_id in ids:
+        PAGE_CACHE.pop(invite_id)
+    return ids
+
+
+def complete_due(batch=1000, now=None):
+    """\
+    This marks all the pending invitations that have started as done, a
+    batch at a time, and returns how many there were.
+    """
+    cutoff = now or datetime.datetime.now()
+    count = 0
+    while True:
+        ids = complete_batch(cutoff, batch)
+        count += len(ids)
+        if len(ids) < batch:
+            break
+    return count
@@ -0,0 +1,107 @@
+"""\
+A durable, local spool for incoming messages.
+
+When it's turned on, the webhook only appends the raw message to the spool
+and returns, and a worker (`python -m frank.manage drain_spool`) running on
+the same machine ingests them in batches.
+"""
+
+
+import json
+import sqlite3
+import time
+
+
+SPOOL_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS spool (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    payload TEXT NOT NULL,
+    received REAL NOT NULL,
+    claimed REAL
+)
+'''
+
+
+class Spool:
+    """\
+    This is a queue of message payloads in a SQLite file.
+
+    Workers `claim` a batch, ingest it, and then `remove` it. Claims expire
+    after `lease` seconds, so a batch left behind by a worker that died, or
+    payloads it couldn't insert, are picked up again.
+    """
+
+    def __init__(self, path, lease=300.0):
+        self.path = path
+        self.lease = lease
+        with self.connect() as conn:
+            conn.execute(SPOOL_SCHEMA)
+
+    def connect(self):
+        """Open a connection to the spool file."""
+        conn = sqlite3.connect(self.path, timeout=30.0)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=FULL')
+        return conn
+
+    def append(self, payload):
+        """Add a JSON-able payload to the spool and return its ID."""
+        conn = self.connect()
+        try:
+            with conn:
+                cursor = conn.execute(
+                    'INSERT INTO spool (payload, received) VALUES (?, ?)',
+                    (json.dumps(payload), time.time()),
+                )
+            return cursor.lastrowid
+        finally:
+            conn.close()
+
+    def claim(self, limit):
+        """\
+        Claim up to `limit` of the oldest unclaimed payloads. This returns a
+        list of (ID, payload) pairs.
+        """
+        now = time.time()
+        conn = self.connect()
+        try:
+            conn.isolation_level = None
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = conn.execute(
+                    'SELECT id, payload FROM spool '
+                    'WHERE claimed IS NULL OR claimed < ? '
+                    'ORDER BY id LIMIT ?',
+                    (now - self.lease, limit),
+                ).fetchall()
+                conn.executemany(
+                    'UPDATE spool SET claimed = ? WHERE id = ?',
+                    [(now, spool_id) for spool_id, _ in rows],
+                )
+                conn.execute('COMMIT')
+            except:
+                conn.execute('ROLLBACK')
+                raise
+        finally:
+            conn.close()
+
+        return [(spool_id, json.loads(payload)) for spool_id, payload in rows]
+
+    def remove(self, ids):
+        """Remove payloads that have been handled."""
+        conn = self.connect()
+        try:
+            with conn:
+                conn.executemany(
+                    'DELETE FROM spool WHERE id = ?',
+                    [(spool_id,) for spool_id in ids],
+                )
+        finally:
+            conn.close()
+
+    def __len__(self):
+        conn = self.connect()
+        try:
+            return conn.execute('SELECT COUNT(*) FROM spool').fetchone()[0]
+        finally:
+            conn.close()
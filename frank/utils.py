@@ -1,7 +1,10 @@
 """Random utilities"""
 
 
+import collections
 import datetime
+import itertools
+import threading
 
 
 def date_parses(date_str, date_format):
@@ -14,3 +17,74 @@ def date_parses(date_str, date_format):
         return False
     else:
         return True
+
+
+def chunks(iterable, size):
+    """This breaks `iterable` into lists of at most `size` items."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            break
+        yield chunk
+
+
+class LRUCache:
+    """\
+    This is a bounded, thread-safe mapping that evicts the least recently used
+    entries when it's full. It keeps count of its hits, misses, and
+    evictions.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """Return the value for `key`, or `default` if it isn't cached."""
+        with self.lock:
+            try:
+                value = self.entries.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self.entries[key] = value
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Cache `value` for `key`, evicting the oldest entries if needed."""
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = value
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key):
+        """Drop `key` from the cache, if it's there."""
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        """Drop everything from the cache."""
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        """Return a dict of the cache's size and counts."""
+        with self.lock:
+            return {
+                'size': len(self.entries),
+                'capacity': self.capacity,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,18 @@
+"""The Prometheus metrics endpoint."""
+
+
+from flask import Blueprint, Response
+
+from frank import metrics as frank_metrics
+
+
+metrics = Blueprint('metrics', __name__)
+
+
+@metrics.route('/metrics')
+def index():
+    """Return this process's metrics in the Prometheus text format."""
+    return Response(
+        frank_metrics.render(),
+        mimetype='text/plain; version=0.0.4',
+    )
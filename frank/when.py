@@ -0,0 +1,203 @@
+"""\
+The grammar for the 'When:' lines in invitations.
+
+Each form of line has one compiled pattern, and names are looked up in
+tables, so a line is parsed in one pass without trying formats until one
+fits. `parse` returns a plain, immutable tuple; `MeetingTime.parse` turns it
+into a `MeetingTime`.
+"""
+
+
+import calendar
+import datetime
+import re
+import time
+
+
+# Full names, lower-cased, as `strptime`'s %A and %B matched them. Monday = 0,
+# to 6, as in `datetime.weekday`, and January = 1, to 12.
+WEEKDAYS = {name.lower(): i for i, name in enumerate(calendar.day_name)}
+MONTHS = {
+    name.lower(): i for i, name in enumerate(calendar.month_name) if name
+}
+# The zone names `strptime`'s %Z accepted.
+TZ_NAMES = frozenset(
+    ['utc', 'gmt'] + [name.lower() for name in time.tzname]
+)
+
+# These pieces match what the `strptime` directives they replace did.
+HOUR = r'1[0-2]|0[1-9]|[1-9]'
+MINUTE = r'[0-5]\d|\d'
+DAY = r'3[01]|[12]\d|0[1-9]|[1-9]'
+MONTH = r'1[0-2]|0[1-9]|[1-9]'
+AMPM = r'[AaPp][Mm]'
+END = r'(?=\s|$)'
+
+
+def _time(prefix):
+    """A 12-hour time, e.g. '4:00 PM', with its groups named for `prefix`."""
+    return (r'(?P<{0}h>{1}):(?P<{0}m>{2})\s+(?P<{0}p>{3}){4}'
+            .format(prefix, HOUR, MINUTE, AMPM, END))
+
+
+# Effective dates on recurring meetings, e.g. '4/29/2016.'
+EFFECTIVE = (r'(?P<mo>{})/(?P<d>{})/(?P<y>\d\d\d\d)\.{}'
+             .format(MONTH, DAY, END))
+
+# Wednesday, April 20, 2016 9:00 PM-10:00 PM (UTC-05:00)
+ONCE = re.compile(
+    r'\s*(?P<weekday>[A-Za-z]+),\s+(?P<month>[A-Za-z]+)\s+(?P<day>{day}),'
+    r'\s+(?P<year>\d\d\d\d)\s+'
+    r'(?P<sh>{hour}):(?P<sm>{minute})\s+(?P<sp>{ampm})-'
+    r'(?P<eh>{hour}):(?P<em>{minute}){end}'
+    r'\s+(?P<ep>\S+)'
+    r'\s+\((?P<tz>[A-Za-z]+)(?P<sign>[+-])(?P<oh>\d\d):*(?P<om>[0-5]\d)\)'
+    r'{end}'.format(
+        day=DAY, hour=HOUR, minute=MINUTE, ampm=AMPM, end=END,
+    )
+)
+
+# Occurs every Friday from 4:00 PM to 4:30 PM effective 4/29/2016.
+RECURRING_HEAD = re.compile(r'Occurs\s+every\s+(?P<head>\S+)')
+
+DAILY_PREFIX = 'Occurs every day from '
+MONTHLY_PREFIX = 'Occurs every month on day '
+
+# The rest of the line after DAILY_PREFIX.
+DAILY = re.compile(
+    r'\s*' + _time('s') + r'\s+\S+\s+' + _time('e') + r'\s+\S+\s+' + EFFECTIVE
+)
+# The rest of the line after RECURRING_HEAD.
+WEEKLY = re.compile(
+    r'\s+\S+\s+' + _time('s') + r'\s+\S+\s+' + _time('e') + r'\s+\S+\s+' +
+    EFFECTIVE
+)
+# The rest of the line after MONTHLY_PREFIX.
+MONTHLY = re.compile(
+    r'\s*(?P<month_day>[+-]?\d+){end}(?:\s+\S+){{4}}\s+'.format(end=END) +
+    _time('s') + r'\s+\S+\s+' + _time('e') + r'\s+\S+\s+' + EFFECTIVE
+)
+# The rest of the line after RECURRING_HEAD.
+ANNUALLY = re.compile(
+    r'\s+(?P<day>{day}){end}\s+\S+\s+'.format(day=DAY, end=END) +
+    _time('s') + r'\s+\S+\s+' + _time('e') + r'\s+\S+\s+' + EFFECTIVE
+)
+
+
+def _clock(match, prefix):
+    """Return the `datetime.time` for the 12-hour time named by `prefix`."""
+    hour = int(match.group(prefix + 'h')) % 12
+    if match.group(prefix + 'p').lower() == 'pm':
+        hour += 12
+    return datetime.time(hour, int(match.group(prefix + 'm')))
+
+
+def _effective(match):
+    """Return the effective `datetime.date` of a recurring meeting."""
+    return datetime.date(
+        int(match.group('y')), int(match.group('mo')), int(match.group('d')),
+    )
+
+
+def _invalid(line):
+    return ValueError('Invalid "when" line: "{}"'.format(line))
+
+
+def parse(line, year=None):
+    """\
+    Parse a 'When' line into a tuple of (start, end, recur, recur_param),
+    where `recur` is the name of a `RecurPeriod`. `year` is the current year,
+    which annually recurring lines are checked against; it defaults to now.
+
+    This raises ValueError if the line isn't in any form we know.
+    """
+    if line.startswith('Occurs '):
+        return parse_recurring(line, year)
+    else:
+        return parse_once(line)
+
+
+def parse_once(line):
+    """Parse a 'When' line from a sole-occuring invitation."""
+    match = ONCE.match(line)
+    if match is None:
+        raise _invalid(line)
+
+    weekday = match.group('weekday').lower()
+    month = MONTHS.get(match.group('month').lower())
+    end_ampm = match.group('ep').replace('.', '')
+    if (weekday not in WEEKDAYS or month is None or
+            end_ampm.lower() not in ('am', 'pm') or
+            match.group('tz').lower() not in TZ_NAMES):
+        raise _invalid(line)
+
+    offset = datetime.timedelta(
+        hours=int(match.group('oh')), minutes=int(match.group('om')),
+    )
+    if match.group('sign') == '-':
+        offset = -offset
+    tzinfo = datetime.timezone(offset, match.group('tz'))
+
+    date = datetime.date(
+        int(match.group('year')), month, int(match.group('day')),
+    )
+    start = datetime.datetime.combine(date, _clock(match, 's'))
+    hour = int(match.group('eh')) % 12
+    if end_ampm.lower() == 'pm':
+        hour += 12
+    end = datetime.datetime.combine(
+        date, datetime.time(hour, int(match.group('em'))),
+    )
+
+    return (
+        start.replace(tzinfo=tzinfo), end.replace(tzinfo=tzinfo), 'none', None,
+    )
+
+
+def parse_recurring(line, year=None):
+    """Parse a 'When' line from a recurring invitation."""
+    head = RECURRING_HEAD.match(line)
+    if head is None:
+        raise _invalid(line)
+    name = head.group('head').lower()
+
+    if line.startswith(DAILY_PREFIX):
+        match = DAILY.match(line, len(DAILY_PREFIX))
+        recur, param = 'daily', None
+
+    elif name in WEEKDAYS:
+        match = WEEKLY.match(line, head.end())
+        recur, param = 'weekly', WEEKDAYS[name]
+
+    elif line.startswith(MONTHLY_PREFIX):
+        match = MONTHLY.match(line, len(MONTHLY_PREFIX))
+        recur = 'monthly'
+        param = match and int(match.group('month_day'))
+
+    elif name in MONTHS:
+        match = ANNUALLY.match(line, head.end())
+        if match is None:
+            raise _invalid(line)
+        if year is None:
+            year = datetime.datetime.now().year
+        month, day = MONTHS[name], int(match.group('day'))
+        # This has to be a real day this year.
+        datetime.date(year, month, day)
+
+        start = datetime.datetime.combine(
+            _effective(match), _clock(match, 's'),
+        )
+        end = datetime.datetime.combine(
+            datetime.date(start.year, month, day), _clock(match, 'e'),
+        )
+        return (start, end, 'annually', (start.month, start.day))
+
+    else:
+        raise _invalid(line)
+
+    if match is None:
+        raise _invalid(line)
+    date = _effective(match)
+    start = datetime.datetime.combine(date, _clock(match, 's'))
+    end = datetime.datetime.combine(date, _clock(match, 'e'))
+    return (start, end, recur, param)
@@ -0,0 +1,79 @@
+"""Keyed and indexed attendees and consult_attendees.
+
+Revision ID: 9b6c2f0e8d41
+Revises: 0a9d4e7b3c15
+Create Date: 2026-10-18 14:36:19.558302
+
+Neither table had a primary key, so they may hold duplicate pairs. Each one
+is copied, without duplicates, a range of IDs at a time, into a new table
+with the key, which then replaces it.
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '9b6c2f0e8d41'
+down_revision = '0a9d4e7b3c15'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# How many invitations' or consults' rows are copied at a time.
+CHUNK = 10000
+
+# (table, column for the invitation or consult, the table it refers to)
+TABLES = [
+    ('attendees', 'invitation_id', 'invitation'),
+    ('consult_attendees', 'consult_id', 'consult'),
+]
+
+
+def copy_table(source, target, key, distinct):
+    """Copy the rows from `source` to `target`, CHUNK keys at a time."""
+    conn = op.get_bind()
+    (low, high) = conn.execute(sa.text(
+        'SELECT MIN({key}), MAX({key}) FROM {source}'
+        .format(key=key, source=source)
+    )).fetchone()
+    if low is None:
+        return
+    select = 'SELECT DISTINCT' if distinct else 'SELECT'
+    copy = sa.text(
+        'INSERT INTO {target} ({key}, profile_id) '
+        '{select} {key}, profile_id FROM {source} '
+        'WHERE {key} >= :low AND {key} < :high AND profile_id IS NOT NULL'
+        .format(target=target, key=key, select=select, source=source)
+    )
+    for start in range(low, high + 1, CHUNK):
+        conn.execute(copy, low=start, high=start + CHUNK)
+
+
+def upgrade():
+    for (table, key, parent) in TABLES:
+        op.create_table(table + '_new',
+        sa.Column(key, sa.Integer(), nullable=False),
+        sa.Column('profile_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint([key], [parent + '.id'], ),
+        sa.ForeignKeyConstraint(['profile_id'], ['profile.id'], ),
+        sa.PrimaryKeyConstraint(key, 'profile_id', name=table + '_pkey')
+        )
+        copy_table(table, table + '_new', key, distinct=True)
+        op.drop_table(table)
+        op.rename_table(table + '_new', table)
+        op.create_index('ix_{}_profile_id_{}'.format(table, key), table,
+                        ['profile_id', key], unique=False)
+
+
+def downgrade():
+    for (table, key, parent) in TABLES:
+        op.drop_index('ix_{}_profile_id_{}'.format(table, key),
+                      table_name=table)
+        op.create_table(table + '_old',
+        sa.Column(key, sa.Integer(), nullable=True),
+        sa.Column('profile_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint([key], [parent + '.id'], ),
+        sa.ForeignKeyConstraint(['profile_id'], ['profile.id'], )
+        )
+        copy_table(table, table + '_old', key, distinct=False)
+        op.drop_table(table)
+        op.rename_table(table + '_old', table)